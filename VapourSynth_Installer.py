@@ -6,29 +6,523 @@ Automatically sets up the working environment with proper versions
 
 import os
 import sys
+import argparse
 import subprocess
-import platform
 import json
 import urllib.request
 from pathlib import Path
 import venv
 import shutil
 
+from install_engine import (InstallEngine, InstallError, WheelCache, DEFAULT_CACHE_DIR,
+                            DEFAULT_CACHE_LIMIT, DEFAULT_PROFILE, cache_limit, choose_profile,
+                            load_lock, lock_packages, lock_profile, lock_requirements,
+                            locked_artifacts, platform_key, profile_index, read_installed,
+                            canonical_name, download_footprint, directory_size)
+from platform_backend import get_backend, TUNING_FILE_NAME
+from venv_template import clone_environment, mark_template, read_template
+from event_log import EventLog, print_summary
+
+DEFAULT_TEMPLATE_DIR = Path.home() / "VapourSynth_Template"
+# A wedged driver can make nvidia-smi hang forever
+NVIDIA_SMI_TIMEOUT = 10
+
+TUNING_MODULE = '''"""
+Tuned VapourSynth core settings for this machine
+Written by test_setup.py --tune; scripts and .vpy files call
+vs_tuning.apply(core) right after getting the core.
+"""
+
+import os
+import sys
+import json
+
+CONFIG = os.environ.get("VS_TUNING_CONFIG") or os.path.join(sys.prefix, "{name}")
+
+
+def load(path=None):
+    """Tuned settings, or None if this machine has not been tuned"""
+    try:
+        with open(path or CONFIG) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def apply(core=None, path=None):
+    """Set core.num_threads and core.max_cache_size from the tuning file"""
+    settings = load(path)
+    if not settings:
+        return None
+    if core is None:
+        import vapoursynth
+        core = vapoursynth.core
+    core.num_threads = settings["num_threads"]
+    core.max_cache_size = settings["max_cache_size"]
+    return settings
+'''.replace("{name}", TUNING_FILE_NAME)
+
+VPY_TEMPLATE = '''# VapourSynth script template for this environment
+# Copy it, put your processing in the middle and point the player at the copy
+import vapoursynth as vs
+import vs_tuning
+
+core = vs.core
+vs_tuning.apply(core)  # threads / cache size from test_setup.py --tune
+
+# mpv (--vf=vapoursynth=script.vpy) passes the decoded video as video_in
+clip = globals().get("video_in")
+if clip is None:
+    clip = core.std.BlankClip(width=1920, height=1080, format=vs.YUV420P8, length=240)
+
+# ... processing goes here ...
+
+clip.set_output()
+'''
+
+# test_setup.py, written into every environment (and run by abi_matrix.py)
+TEST_SCRIPT = '''#!/usr/bin/env python
+"""Test VapourSynth installation
+
+python test_setup.py                      smoke test of numpy / torch / vapoursynth
+python test_setup.py --gpu                also import torch and check CUDA
+python test_setup.py --benchmark          CPU-only frame -> NumPy throughput benchmark
+python test_setup.py --startup-profile    per-module import time of this script
+python test_setup.py --startup-profile x.vpy   ...or of any .py/.vpy script
+python test_setup.py --tune               pick core.num_threads / max_cache_size for this CPU
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import importlib.metadata
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080), "4k": (3840, 2160)}
+FORMATS = ["YUV420P8", "YUV420P16", "RGBS"]
+WARMUP_FRAMES = 5
+TUNE_CACHE_SIZES = [512, 1024, 2048, 4096]
+# Settings within this fraction of the best fps count as a tie; the cheaper one wins
+TUNE_TOLERANCE = 0.03
+
+
+def smoke_test(gpu=False):
+    print(f"Python: {sys.version}")
+
+    try:
+        import numpy as np
+        print(f"✅ NumPy: {np.__version__}", end="")
+        if np.__version__.startswith("2."):
+            print(" ❌ ERROR: NumPy 2.0 will break VapourSynth!")
+        elif np.__version__.startswith("1.26"):
+            print(" ✅ Correct version!")
+        else:
+            print(" ⚠️  Unexpected version")
+    except ImportError as e:
+        print(f"❌ NumPy import failed: {e}")
+
+    # torch + CUDA initialisation dominates cold start, so torch is only
+    # imported on the --gpu path; nothing before this point may pull it in
+    if "torch" in sys.modules:
+        print("⚠️  torch was already imported before it was needed (slower startup)")
+    try:
+        print(f"✅ PyTorch: {importlib.metadata.version('torch')}")
+        if gpu:
+            import torch
+            if torch.cuda.is_available():
+                print(f"✅ CUDA available: {torch.cuda.get_device_name(0)}")
+            else:
+                print("⚠️  CUDA not available")
+        else:
+            print("ℹ️  CUDA check skipped (run with --gpu)")
+    except (ImportError, importlib.metadata.PackageNotFoundError):
+        print("⚠️  PyTorch not installed (optional)")
+
+    try:
+        import vapoursynth as vs
+        core = vs.core
+        print(f"✅ VapourSynth: {core.version()}")
+
+        # Test basic functionality
+        clip = core.std.BlankClip()
+        print("✅ VapourSynth core is functional")
+        
+        try:
+            import vs_tuning
+            settings = vs_tuning.apply(core)
+            if settings:
+                print(f"✅ Core tuned: {settings['num_threads']} threads, "
+                      f"{settings['max_cache_size']} MB cache")
+            else:
+                print("ℹ️  Core not tuned for this machine yet (run with --tune)")
+        except ImportError:
+            pass
+    except ImportError as e:
+        print(f"❌ VapourSynth import failed: {e}")
+    except Exception as e:
+        print(f"❌ VapourSynth core error: {e}")
+
+    print("\\n" + "="*50)
+    print("Test complete! Check for any ❌ errors above.")
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    try:
+        import resource
+    except ImportError:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize",
+                    "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage",
+                    "PagefileUsage", "PeakPagefileUsage")]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize / 1024 ** 2
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def benchmark_case(resolution, fmt, frames):
+    """Time get_frame + NumPy conversion for one resolution/format in this process"""
+    import numpy as np
+    import vapoursynth as vs
+    core = vs.core
+
+    width, height = RESOLUTIONS[resolution]
+    clip = core.std.BlankClip(width=width, height=height, format=getattr(vs, fmt),
+                              length=frames + WARMUP_FRAMES)
+
+    latencies = []
+    for n in range(clip.num_frames):
+        start = time.perf_counter()
+        frame = clip.get_frame(n)
+        planes = [np.array(frame[p], copy=True) for p in range(frame.format.num_planes)]
+        elapsed = time.perf_counter() - start
+        del frame, planes
+        if n >= WARMUP_FRAMES:
+            latencies.append(elapsed)
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "resolution": resolution,
+        "format": fmt,
+        "frames": frames,
+        "fps": frames / (latencies_ms.sum() / 1000),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p90_ms": float(np.percentile(latencies_ms, 90)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def benchmark(resolutions, formats, frames, as_json):
+    """Run every case in its own subprocess so peak RSS is per case"""
+    import numpy as np
+    import vapoursynth as vs
+    results = []
+    if not as_json:
+        print(f"NumPy {np.__version__} / VapourSynth {vs.__version__} / {frames} frames per case")
+        print(f"{'case':<20}{'fps':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'peak MB':>10}")
+    for resolution in resolutions:
+        for fmt in formats:
+            cmd = [sys.executable, __file__, "--benchmark-case", f"{resolution}:{fmt}",
+                   "--frames", str(frames)]
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            if proc.returncode != 0:
+                error = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+                result = {"resolution": resolution, "format": fmt, "error": error}
+                if not as_json:
+                    print(f"{resolution + ' ' + fmt:<20}  ❌ {error}")
+            else:
+                result = json.loads(proc.stdout)
+                if not as_json:
+                    print(f"{resolution + ' ' + fmt:<20}{result['fps']:>10.1f}{result['p50_ms']:>10.2f}"
+                          f"{result['p90_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['peak_rss_mb']:>10.1f}")
+            results.append(result)
+    if as_json:
+        print(json.dumps({"numpy": np.__version__, "vapoursynth": str(vs.__version__),
+                          "results": results}, indent=2))
+    return all("error" not in r for r in results)
+
+
+def thread_candidates():
+    """Thread counts worth trying on this CPU"""
+    cpus = os.cpu_count() or 4
+    counts = {1, max(1, cpus // 2), cpus, cpus + cpus // 2}
+    counts.update(2 ** i for i in range(1, cpus.bit_length()) if 2 ** i < cpus)
+    return sorted(counts)
+
+
+def tune_case(threads, cache_mb, frames):
+    """fps of the synthetic pipeline with one core setting, in this process
+
+    BlankClip -> resize -> temporal average -> NumPy round-trip, which
+    exercises the thread pool, the frame cache and the Python/NumPy path
+    the way interpolation scripts do.
+    """
+    import numpy as np
+    import vapoursynth as vs
+    core = vs.core
+    core.num_threads = threads
+    core.max_cache_size = cache_mb
+
+    clip = core.std.BlankClip(width=1920, height=1080, format=vs.YUV420P8,
+                              length=frames + WARMUP_FRAMES, color=[16, 128, 128], keep=0)
+    clip = core.resize.Bicubic(clip, 1280, 720, format=vs.YUV444P16)
+    clip = core.std.AverageFrames(clip, weights=[1, 2, 1])
+
+    def roundtrip(n, f):
+        out = f.copy()
+        for plane in range(out.format.num_planes):
+            np.copyto(np.asarray(out[plane]), np.asarray(f[plane]) >> 1)
+        return out
+
+    clip = core.std.ModifyFrame(clip, clip, roundtrip)
+    for n in range(WARMUP_FRAMES):
+        clip.get_frame(n)
+
+    start = time.perf_counter()
+    for frame in clip[WARMUP_FRAMES:].frames():
+        pass
+    elapsed = time.perf_counter() - start
+    return {"threads": threads, "cache_mb": cache_mb, "fps": frames / elapsed,
+            "peak_rss_mb": peak_rss_mb()}
+
+
+def pick_best(results):
+    """Fastest setting, preferring fewer threads and less cache on a near-tie"""
+    ok = [r for r in results if "error" not in r]
+    if not ok:
+        return None
+    fastest = max(r["fps"] for r in ok)
+    ties = [r for r in ok if r["fps"] >= fastest * (1 - TUNE_TOLERANCE)]
+    return min(ties, key=lambda r: (r["threads"], r["cache_mb"]))
+
+
+def tune(frames, as_json):
+    """Sweep thread counts, then cache sizes, and save the best to the tuning file"""
+    import vapoursynth as vs
+    import vs_tuning
+    default_cache = vs.core.max_cache_size
+    results = []
+
+    def run_stage(cases):
+        stage = []
+        for threads, cache_mb in cases:
+            cmd = [sys.executable, __file__, "--tune-case", f"{threads}:{cache_mb}",
+                   "--frames", str(frames)]
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            if proc.returncode != 0:
+                error = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+                result = {"threads": threads, "cache_mb": cache_mb, "error": error}
+                if not as_json:
+                    print(f"{threads:>8}{cache_mb:>10}  ❌ {error}")
+            else:
+                result = json.loads(proc.stdout)
+                if not as_json:
+                    print(f"{threads:>8}{cache_mb:>10}{result['fps']:>10.1f}{result['peak_rss_mb']:>10.1f}")
+            stage.append(result)
+        results.extend(stage)
+        return pick_best(stage)
+
+    if not as_json:
+        print(f"Tuning on {os.cpu_count()} CPUs, {frames} frames per setting")
+        print(f"{'threads':>8}{'cache MB':>10}{'fps':>10}{'peak MB':>10}")
+    best = run_stage([(threads, default_cache) for threads in thread_candidates()])
+    if best is None:
+        print("❌ Tuning pipeline failed")
+        return False
+    best = run_stage([(best["threads"], cache_mb) for cache_mb in TUNE_CACHE_SIZES
+                      if cache_mb != default_cache] + [(best["threads"], default_cache)])
+
+    settings = {
+        "num_threads": best["threads"],
+        "max_cache_size": best["cache_mb"],
+        "fps": round(best["fps"], 1),
+        "cpu_count": os.cpu_count(),
+        "tuned_at": time.time(),
+        "results": results,
+    }
+    # Replace rather than rewrite: the file may be hardlinked into other environments
+    tmp = f"{vs_tuning.CONFIG}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(settings, f, indent=2)
+    os.replace(tmp, vs_tuning.CONFIG)
+    if as_json:
+        print(json.dumps(settings, indent=2))
+    else:
+        print(f"\\n✅ Best: {settings['num_threads']} threads, {settings['max_cache_size']} MB cache "
+              f"({settings['fps']} fps) -> {vs_tuning.CONFIG}")
+    return True
+
+
+def parse_importtime(stderr):
+    """Parse -X importtime output into (module, self us, cumulative us, depth) rows"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def startup_profile(target, top, as_json):
+    """Run a script under -X importtime and summarise where startup goes"""
+    if target is None:
+        cmd = [sys.executable, "-X", "importtime", __file__]
+        target = __file__
+    else:
+        code = ("import runpy, sys; sys.argv = [sys.argv[1]]; "
+                "runpy.run_path(sys.argv[0], run_name='__vapoursynth__')")
+        cmd = [sys.executable, "-X", "importtime", "-c", code, target]
+
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    rows = parse_importtime(proc.stderr)
+    packages = {}
+    for name, self_us, cumulative_us, depth in rows:
+        root = name.split(".")[0]
+        packages[root] = packages.get(root, 0) + self_us
+    summary = {
+        "target": target,
+        "exit_code": proc.returncode,
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(sum(r[2] for r in rows if r[3] == 0) / 1000, 1),
+        "modules_imported": len(rows),
+        "packages": sorted(({"package": k, "ms": round(v / 1000, 1)} for k, v in packages.items()),
+                           key=lambda p: -p["ms"])[:top],
+        "modules": [{"module": name, "self_ms": round(self_us / 1000, 1),
+                     "cumulative_ms": round(cumulative_us / 1000, 1)}
+                    for name, self_us, cumulative_us, depth
+                    in sorted(rows, key=lambda r: -r[1])[:top]],
+    }
+
+    if as_json:
+        print(json.dumps(summary, indent=2))
+        return proc.returncode == 0
+    print(f"Startup profile of {target}")
+    print(f"  wall time     {summary['wall_ms']:>9.1f} ms")
+    print(f"  import time   {summary['import_ms']:>9.1f} ms ({len(rows)} modules)")
+    print(f"\\n{'package':<30}{'ms':>10}")
+    for entry in summary["packages"]:
+        print(f"{entry['package']:<30}{entry['ms']:>10.1f}")
+    print(f"\\n{'module (self time)':<40}{'self ms':>10}{'cumul ms':>10}")
+    for entry in summary["modules"]:
+        print(f"{entry['module']:<40}{entry['self_ms']:>10.1f}{entry['cumulative_ms']:>10.1f}")
+    if proc.returncode != 0:
+        print(f"\\n⚠️  {target} exited with code {proc.returncode}")
+    return proc.returncode == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test VapourSynth installation")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Measure frame -> NumPy throughput (CPU only)")
+    parser.add_argument("--frames", type=int, default=200, help="Frames per benchmark or tuning case")
+    parser.add_argument("--resolutions", nargs="+", choices=list(RESOLUTIONS),
+                        default=list(RESOLUTIONS))
+    parser.add_argument("--formats", nargs="+", default=FORMATS)
+    parser.add_argument("--json", action="store_true", help="Print benchmark or tuning results as JSON")
+    parser.add_argument("--gpu", action="store_true", help="Import torch and check CUDA")
+    parser.add_argument("--startup-profile", nargs="?", const="", metavar="SCRIPT",
+                        help="Profile per-module import time of this script or SCRIPT")
+    parser.add_argument("--top", type=int, default=15, help="Rows in the startup profile")
+    parser.add_argument("--tune", action="store_true",
+                        help="Benchmark core thread/cache settings and save the best")
+    parser.add_argument("--tune-case", help=argparse.SUPPRESS)
+    parser.add_argument("--benchmark-case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.benchmark_case:
+        resolution, fmt = args.benchmark_case.split(":")
+        print(json.dumps(benchmark_case(resolution, fmt, args.frames)))
+    elif args.tune_case:
+        threads, cache_mb = map(int, args.tune_case.split(":"))
+        print(json.dumps(tune_case(threads, cache_mb, args.frames)))
+    elif args.tune:
+        sys.exit(0 if tune(args.frames, args.json) else 1)
+    elif args.benchmark:
+        sys.exit(0 if benchmark(args.resolutions, args.formats, args.frames, args.json) else 1)
+    elif args.startup_profile is not None:
+        sys.exit(0 if startup_profile(args.startup_profile or None, args.top, args.json) else 1)
+    else:
+        smoke_test(args.gpu)
+'''
+
+
+def replace_file(path, text):
+    """Write text through a temp file and os.replace, never in place
+
+    In an environment cloned from a template, package files are hardlinked
+    to the template; writing one in place would change the template and
+    every other clone. Identical content is left untouched.
+    """
+    path = Path(path)
+    try:
+        if path.read_text(encoding="utf-8") == text:
+            return
+    except (OSError, UnicodeDecodeError):
+        pass
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'w', encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
 class VapourSynthInstaller:
-    def __init__(self):
+    def __init__(self, offline=False, wheelhouse=None, reconcile=False,
+                 install_dir=None, interactive=True, recreate=False, backend=None,
+                 launcher_dir=None, template=None, build_template=False, event_log=None,
+                 profile=None, tune=False, cache_limit=DEFAULT_CACHE_LIMIT):
         self.home = Path.home()
-        self.install_dir = self.home / "VapourSynth_Environment"
+        self.install_dir = Path(install_dir) if install_dir else self.home / "VapourSynth_Environment"
         self.issues_found = []
         self.fixes_applied = []
+        self.offline = offline
+        self.wheelhouse = Path(wheelhouse) if wheelhouse else DEFAULT_CACHE_DIR
+        self.cache_limit = cache_limit
+        self.reconcile = reconcile
+        self.interactive = interactive
+        self.recreate = recreate
+        self.backend = backend or get_backend()
+        self.launchers = []
+        self.launcher_dir = launcher_dir
+        self.template = Path(template) if template else None
+        self.build_template = build_template
+        self.cloned = False
+        self.event_log = (Path(event_log) if event_log else
+                          self.install_dir.with_name(self.install_dir.name + "_install_events.jsonl"))
+        self.events = EventLog()
+        self.requested_profile = profile
+        self.profile = None
+        self.profile_report = None
+        self.gpu = False
+        self.tune = tune
         
     def check_system(self):
         """Check system compatibility"""
         print("🔍 Checking system requirements...")
         
         # Check OS
-        if platform.system() != "Windows":
-            print("⚠️  This installer is designed for Windows")
+        if not self.backend.supported:
+            print(f"⚠️  {self.backend.name} is not supported (Windows and Linux only)")
             return False
+        print(f"OS: {self.backend.name}")
             
         # Check Python version
         py_version = sys.version_info
@@ -40,11 +534,18 @@ class VapourSynthInstaller:
             
         # Check for NVIDIA GPU
         try:
-            result = subprocess.run(['nvidia-smi'], capture_output=True, text=True)
+            with self.events.span("nvidia-smi") as span:
+                result = subprocess.run(['nvidia-smi'], capture_output=True, text=True,
+                                        timeout=NVIDIA_SMI_TIMEOUT)
+                span["exit_code"] = result.returncode
+            self.gpu = result.returncode == 0
             if result.returncode == 0:
                 print("✅ NVIDIA GPU detected")
             else:
                 print("⚠️  No NVIDIA GPU detected - CPU mode only")
+                print("   (universal_converter.interpolate_clip does 2x interpolation on the CPU)")
+        except subprocess.TimeoutExpired:
+            print(f"⚠️  nvidia-smi did not answer within {NVIDIA_SMI_TIMEOUT}s - CPU mode only")
         except:
             print("⚠️  nvidia-smi not found - GPU acceleration may not work")
             
@@ -55,154 +556,202 @@ class VapourSynthInstaller:
         print(f"\n📦 Creating virtual environment at {self.install_dir}")
         
         if self.install_dir.exists():
-            response = input("Environment exists. Recreate? (y/n): ")
-            if response.lower() == 'y':
+            if self.recreate:
                 shutil.rmtree(self.install_dir)
-            else:
-                return False
+            elif not self.reconcile and not self.interactive:
+                # Unattended runs keep what is there and fix only differences
+                self.reconcile = True
+            elif not self.reconcile:
+                response = input("Environment exists. Reconcile, recreate or cancel? (r/y/n): ")
+                self.reconcile = response.lower() == 'r'
+                if response.lower() == 'y':
+                    shutil.rmtree(self.install_dir)
+                elif not self.reconcile:
+                    return False
+            if self.reconcile and self.install_dir.exists():
+                self.set_environment_paths()
+                print("✅ Keeping existing environment, only differences will be fixed")
+                return True
+        else:
+            self.reconcile = False
+        
+        if self.template:
+            return self.clone_from_template()
                 
         # Create venv
         venv.create(self.install_dir, with_pip=True)
-        
-        # Get paths
-        if platform.system() == "Windows":
-            self.python_exe = self.install_dir / "Scripts" / "python.exe"
-            self.pip_exe = self.install_dir / "Scripts" / "pip.exe"
-        else:
-            self.python_exe = self.install_dir / "bin" / "python"
-            self.pip_exe = self.install_dir / "bin" / "pip"
+        self.set_environment_paths()
             
         print("✅ Virtual environment created")
         return True
     
+    def clone_from_template(self):
+        """Create the environment by linking a verified template"""
+        marker = read_template(self.template)
+        if not marker or not marker.get("verified"):
+            print(f"❌ {self.template} is not a verified template (build one with --build-template)")
+            self.issues_found.append("Template missing or unverified")
+            return False
+        
+        stats = clone_environment(self.template, self.install_dir)
+        self.set_environment_paths()
+        self.cloned = True
+        print(f"✅ Cloned template in {stats['seconds']:.2f}s "
+              f"({stats['files']} files, {stats['mode'] or 'copy'}, {stats['rewritten']} rewritten)")
+        self.fixes_applied.append(f"Cloned environment from {self.template}")
+        return True
+    
+    def verify_pins(self):
+        """Check every pinned package is installed at its pinned version (metadata only)"""
+        installed = read_installed(self.site_packages)
+        ok = True
+        for package in lock_packages(load_lock(), self.profile or DEFAULT_PROFILE):
+            version = installed.get(canonical_name(package["name"]))
+            if version != package["version"]:
+                print(f"❌ {package['name']}: expected {package['version']}, found {version}")
+                ok = False
+        return ok, installed
+    
+    def set_environment_paths(self):
+        """Locate python, pip and site-packages inside the environment"""
+        paths = self.backend.venv_paths(self.install_dir)
+        self.python_exe = paths["python"]
+        self.pip_exe = paths["pip"]
+        self.site_packages = paths["site_packages"]
+    
     def install_packages(self):
         """Install exact working versions"""
         print("\n📥 Installing packages with correct versions...")
         
-        packages = [
-            ("numpy", "1.26.4", "Critical: Must be 1.26.4, NOT 2.0!"),
-            ("torch", "2.7.0+cu118", "CUDA 11.8 build for compatibility"),
-            ("vapoursynth", "72", "R72 is the stable version"),
-        ]
+        lock = load_lock()
+        self.profile, reason = choose_profile(lock, self.gpu, self.install_dir,
+                                              self.requested_profile)
+        settings = lock_profile(lock, self.profile)
+        packages = lock_packages(lock, self.profile)
+        requirements = lock_requirements(lock, self.profile)
+        locked = locked_artifacts(lock, profile=self.profile)
+        print(f"🧩 Install profile: {self.profile} ({reason})")
+        if settings.get("note"):
+            print(f"  ℹ️  {settings['note']}")
+        estimate = download_footprint(locked)
+        if estimate is not None:
+            print(f"  📏 {estimate / 1e9:.2f} GB of wheels")
+        self.events.emit("profile", profile=self.profile, reason=reason, estimated_bytes=estimate)
         
-        # Upgrade pip first
-        subprocess.run([str(self.pip_exe), "install", "--upgrade", "pip"], 
-                      capture_output=True)
+        # Upgrade pip first (needs the network, so not in offline mode)
+        if not self.offline:
+            with self.events.span("pip upgrade") as span:
+                result = subprocess.run([str(self.pip_exe), "install", "--upgrade", "pip"], 
+                                       capture_output=True)
+                span["exit_code"] = result.returncode
         
-        for package, version, note in packages:
-            print(f"\nInstalling {package}=={version}")
-            print(f"  ℹ️  {note}")
-            
-            if package == "torch":
-                # Special handling for PyTorch with CUDA
-                cmd = [
-                    str(self.pip_exe), "install", 
-                    f"torch=={version}", "torchvision", "torchaudio",
-                    "--index-url", "https://download.pytorch.org/whl/cu118"
-                ]
+        for package in packages:
+            print(f"\nQueued {package['name']}=={package['version']}")
+            print(f"  ℹ️  {package['note']}")
+        
+        if locked is None:
+            print(f"\n⚠️  No lock entry for {platform_key(profile=self.profile)} - "
+                  f"resolving against the package index")
+        if self.offline:
+            print(f"\nInstalling offline from wheel cache {self.wheelhouse}...")
+        else:
+            print("\nResolving, downloading and installing in parallel...")
+        engine = InstallEngine(self.pip_exe, cache=WheelCache(self.wheelhouse, self.cache_limit),
+                               offline=self.offline, locked=locked, events=self.events,
+                               torch_index=profile_index(lock, self.profile))
+        try:
+            if self.reconcile:
+                plan = engine.reconcile(requirements, self.site_packages)
             else:
-                cmd = [str(self.pip_exe), "install", f"{package}=={version}"]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                print(f"  ✅ {package} installed successfully")
-                self.fixes_applied.append(f"Installed {package} {version}")
+                engine.run(requirements)
+        except InstallError as e:
+            print("  ❌ Failed to install packages")
+            print(f"  Error: {e}")
+            self.issues_found.append("Failed to install packages")
+        else:
+            if self.reconcile:
+                for artifact in plan["install"] + plan["repin"]:
+                    self.fixes_applied.append(f"Installed {artifact['name']} {artifact['version']}")
+                for name in plan["remove"]:
+                    self.fixes_applied.append(f"Removed {name}")
+                print("  ✅ Environment reconciled with pinned versions")
             else:
-                print(f"  ❌ Failed to install {package}")
-                print(f"  Error: {result.stderr}")
-                self.issues_found.append(f"Failed to install {package}")
+                for package in packages:
+                    print(f"  ✅ {package['name']} installed successfully")
+                    self.fixes_applied.append(f"Installed {package['name']} {package['version']}")
+        engine.print_timings()
+        
+        self.profile_report = {
+            "name": self.profile,
+            "reason": reason,
+            "wheel_bytes": engine.wheel_bytes,
+            "downloaded_bytes": engine.bytes_downloaded,
+            "disk_bytes": directory_size(self.install_dir),
+        }
+        self.events.emit("footprint", **self.profile_report)
+        print(f"  📏 Profile {self.profile}: {engine.wheel_bytes / 1e9:.2f} GB of wheels "
+              f"({engine.bytes_downloaded / 1e9:.2f} GB downloaded this run), "
+              f"environment uses {self.profile_report['disk_bytes'] / 1e9:.2f} GB on disk")
     
     def check_installations(self):
-        """Verify SVP4 and PotPlayer are installed"""
+        """Verify SVP4 and the video player are installed"""
         print("\n🔍 Checking required applications...")
         
         # Check SVP4
-        svp4_paths = [
-            Path(r"C:\Program Files (x86)\SVP 4\SVPManager.exe"),
-            Path(r"C:\Program Files\SVP 4\SVPManager.exe")
-        ]
-        
-        self.svp4_path = None
-        for path in svp4_paths:
-            if path.exists():
-                self.svp4_path = path
-                print(f"✅ SVP4 found: {path}")
-                break
-        
-        if not self.svp4_path:
+        self.svp4_path = self.backend.find_svp4()
+        if self.svp4_path:
+            print(f"✅ SVP4 found: {self.svp4_path}")
+        else:
             print("❌ SVP4 not found")
-            print("  Download from: https://www.svp-team.com/")
+            print(f"  Download from: {self.backend.svp4_url}")
             self.issues_found.append("SVP4 not installed")
         
-        # Check PotPlayer
-        potplayer_paths = [
-            Path(r"C:\Program Files\DAUM\PotPlayer\PotPlayerMini64.exe"),
-            Path(r"C:\Program Files (x86)\DAUM\PotPlayer\PotPlayerMini64.exe")
-        ]
-        
-        self.potplayer_path = None
-        for path in potplayer_paths:
-            if path.exists():
-                self.potplayer_path = path
-                print(f"✅ PotPlayer found: {path}")
-                break
-                
-        if not self.potplayer_path:
-            print("⚠️  PotPlayer not found (optional)")
-            print("  Download from: https://potplayer.daum.net/")
+        # Check the player (PotPlayer on Windows, mpv on Linux)
+        player = self.backend.player_name
+        self.potplayer_path = self.backend.find_player()
+        if self.potplayer_path:
+            print(f"✅ {player} found: {self.potplayer_path}")
+        else:
+            print(f"⚠️  {player} not found (optional)")
+            print(f"  Download from: {self.backend.player_url}")
     
     def create_launcher(self):
         """Create convenient launcher script"""
         print("\n🚀 Creating launcher script...")
         
-        launcher_path = self.home / "Desktop" / "Launch_VapourSynth_SVP4.bat"
+        self.launchers = self.backend.write_launchers(
+            self.install_dir, self.site_packages, self.svp4_path, self.potplayer_path,
+            self.launcher_dir)
         
-        launcher_content = f"""@echo off
-echo ============================================
-echo VapourSynth + SVP4 Launcher (Fixed Versions)
-echo ============================================
-echo.
-echo Using virtual environment with:
-echo - Python 3.12 compatible
-echo - NumPy 1.26.4 (NOT 2.0!)
-echo - VapourSynth R72
-echo - CUDA 11.8 support
-echo.
-
-rem Activate virtual environment
-call "{self.install_dir}\\Scripts\\activate.bat"
-
-rem Set environment variables
-set PYTHONPATH={self.install_dir}\\Lib\\site-packages
-set VAPOURSYNTH_PATH={self.install_dir}\\Lib\\site-packages
-
-rem Start SVP4 if found
-if exist "{self.svp4_path}" (
-    echo Starting SVP4 Manager...
-    start "" "{self.svp4_path}"
-    timeout /t 5 /nobreak >nul
-)
-
-rem Start PotPlayer if found  
-if exist "{self.potplayer_path}" (
-    echo Starting PotPlayer...
-    start "" "{self.potplayer_path}"
-    echo.
-    echo ✅ Remember: In PotPlayer press F5 → Video → VapourSynth → Enable
-)
-
-echo.
-echo ✅ Environment ready! Your setup uses the WORKING versions.
-echo.
-pause
-"""
+        for launcher_path in self.launchers:
+            print(f"✅ Launcher created: {launcher_path}")
+        self.fixes_applied.append("Created launcher")
+    
+    def create_tuning_support(self):
+        """Install the vs_tuning loader and a .vpy template that uses it"""
+        print("\n🎛️  Creating core tuning loader and .vpy template...")
         
-        with open(launcher_path, 'w') as f:
-            f.write(launcher_content)
-            
-        print(f"✅ Launcher created: {launcher_path}")
-        self.fixes_applied.append("Created desktop launcher")
+        module_path = Path(self.site_packages) / "vs_tuning.py"
+        replace_file(module_path, TUNING_MODULE)
+        template_path = self.install_dir / "template.vpy"
+        replace_file(template_path, VPY_TEMPLATE)
+        
+        print(f"✅ Tuning loader: {module_path}")
+        print(f"✅ Script template: {template_path}")
+    
+    def tune_core(self):
+        """Benchmark core thread/cache settings on this CPU and save the best"""
+        print("\n🎛️  Tuning VapourSynth core threads and cache size...")
+        with self.events.span("test_setup.py --tune") as span:
+            result = subprocess.run([str(self.python_exe), str(self.install_dir / "test_setup.py"),
+                                     "--tune"], capture_output=True, text=True)
+            span["exit_code"] = result.returncode
+        print(result.stdout)
+        if result.returncode != 0:
+            print(f"⚠️  Tuning failed: {result.stderr.strip()[-500:]}")
+            self.issues_found.append("Core tuning failed")
+        else:
+            self.fixes_applied.append("Tuned VapourSynth core settings")
     
     def create_test_script(self):
         """Create script to verify the installation"""
@@ -210,98 +759,157 @@ pause
         
         test_script = self.install_dir / "test_setup.py"
         
-        test_content = '''#!/usr/bin/env python
-"""Test VapourSynth installation"""
-
-import sys
-print(f"Python: {sys.version}")
-
-try:
-    import numpy as np
-    print(f"✅ NumPy: {np.__version__}", end="")
-    if np.__version__.startswith("2."):
-        print(" ❌ ERROR: NumPy 2.0 will break VapourSynth!")
-    elif np.__version__.startswith("1.26"):
-        print(" ✅ Correct version!")
-    else:
-        print(" ⚠️  Unexpected version")
-except ImportError as e:
-    print(f"❌ NumPy import failed: {e}")
-
-try:
-    import torch
-    print(f"✅ PyTorch: {torch.__version__}")
-    if torch.cuda.is_available():
-        print(f"✅ CUDA available: {torch.cuda.get_device_name(0)}")
-    else:
-        print("⚠️  CUDA not available")
-except ImportError:
-    print("⚠️  PyTorch not installed (optional)")
-
-try:
-    import vapoursynth as vs
-    core = vs.core
-    print(f"✅ VapourSynth: {core.version()}")
-    
-    # Test basic functionality
-    clip = core.std.BlankClip()
-    print("✅ VapourSynth core is functional")
-except ImportError as e:
-    print(f"❌ VapourSynth import failed: {e}")
-except Exception as e:
-    print(f"❌ VapourSynth core error: {e}")
-
-print("\\n" + "="*50)
-print("Test complete! Check for any ❌ errors above.")
-'''
-        
         with open(test_script, 'w') as f:
-            f.write(test_content)
+            f.write(TEST_SCRIPT)
             
         print(f"✅ Test script created: {test_script}")
         
         # Run the test
         print("\n🧪 Running test...")
-        result = subprocess.run([str(self.python_exe), str(test_script)], 
-                              capture_output=True, text=True)
+        with self.events.span("run test_setup.py") as span:
+            result = subprocess.run([str(self.python_exe), str(test_script)], 
+                                  capture_output=True, text=True)
+            span["exit_code"] = result.returncode
         print(result.stdout)
         
         if result.returncode != 0:
             print(f"⚠️  Test errors: {result.stderr}")
     
+    def step(self, name):
+        """Record one installer step in the event log"""
+        return self.events.span(name)
+    
     def run(self):
-        """Main installation process"""
+        """Main installation process, recorded step by step in the event log"""
+        self.events = EventLog(self.event_log)
+        success = False
+        try:
+            with self.events.span("installer", install_dir=str(self.install_dir)) as span:
+                success = self.run_steps()
+                span["success"] = success
+            return success
+        finally:
+            self.events.emit("result", success=success, issues_found=self.issues_found,
+                             fixes_applied=self.fixes_applied)
+            print_summary(self.events.events)
+            print(f"  📝 Event log: {self.event_log}")
+            self.events.close()
+    
+    def run_steps(self):
         print("="*60)
         print("VapourSynth + SVP4 Community Installer")
         print("Fixing NumPy 2.0 compatibility issues")
         print("="*60)
         
-        if not self.check_system():
-            print("\n❌ System requirements not met")
-            return False
+        with self.step("check_system"):
+            if not self.check_system():
+                print("\n❌ System requirements not met")
+                return False
         
-        if not self.create_virtual_environment():
-            print("\n❌ Failed to create environment")
-            return False
+        with self.step("create_virtual_environment"):
+            if not self.create_virtual_environment():
+                print("\n❌ Failed to create environment")
+                return False
             
-        self.install_packages()
-        self.check_installations()
-        self.create_launcher()
-        self.create_test_script()
+        if not self.cloned:
+            with self.step("install_packages"):
+                self.install_packages()
+        with self.step("check_installations"):
+            self.check_installations()
+        with self.step("create_launcher"):
+            self.create_launcher()
+        with self.step("create_tuning_support"):
+            self.create_tuning_support()
+        with self.step("verify"):
+            self.create_test_script()
+        if self.tune:
+            with self.step("tune"):
+                self.tune_core()
+        
+        if self.build_template:
+            with self.step("verify_pins"):
+                verified, installed = self.verify_pins()
+            mark_template(self.install_dir,
+                          lock_requirements(load_lock(), self.profile or DEFAULT_PROFILE),
+                          installed, verified)
+            if verified:
+                print(f"\n🏅 Template ready: {self.install_dir}")
+            else:
+                print(f"\n❌ Template {self.install_dir} failed verification and will not be cloned")
+                self.issues_found.append("Template failed verification")
         
         print("\n" + "="*60)
         print("✅ INSTALLATION COMPLETE!")
         print("="*60)
         print("\nNext steps:")
-        print("1. Run Launch_VapourSynth_SVP4.bat from your desktop")
-        print("2. In PotPlayer: F5 → Video → VapourSynth → Enable")
-        print("3. Check SVP4 tray icon shows 'Active'")
+        steps = self.backend.next_steps(self.launchers)
+        steps.append(f"Optional: {self.python_exe} {self.install_dir / 'test_setup.py'} --benchmark")
+        if not self.tune:
+            steps.append(f"Optional: {self.python_exe} {self.install_dir / 'test_setup.py'} --tune "
+                         f"(sets core threads/cache for this CPU)")
+        for number, step in enumerate(steps, 1):
+            print(f"{number}. {step}")
         
         return True
 
 if __name__ == "__main__":
-    installer = VapourSynthInstaller()
+    parser = argparse.ArgumentParser(description="VapourSynth + SVP4 Community Installer")
+    parser.add_argument("--offline", action="store_true",
+                        help="Install only from the wheel cache, never touch the network")
+    parser.add_argument("--wheelhouse", metavar="DIR",
+                        help=f"Wheel cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-limit", type=cache_limit, default=DEFAULT_CACHE_LIMIT, metavar="GB",
+                        help="Least recently used wheels are dropped above this size "
+                             f"(default: {DEFAULT_CACHE_LIMIT // 1024 ** 3})")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="Fix an existing environment in place instead of recreating it")
+    parser.add_argument("--recreate", action="store_true",
+                        help="Delete and rebuild an existing environment without asking")
+    parser.add_argument("--install-dir", metavar="DIR",
+                        help="Environment location (default: ~/VapourSynth_Environment)")
+    parser.add_argument("--non-interactive", "-y", action="store_true",
+                        help="Never prompt; an existing environment is reconciled unless --recreate")
+    parser.add_argument("--launcher-dir", metavar="DIR",
+                        help="Write launchers here instead of the desktop / ~/.local/bin")
+    parser.add_argument("--build-template", nargs="?", const=str(DEFAULT_TEMPLATE_DIR), metavar="DIR",
+                        help=f"Build and verify a golden template environment (default: {DEFAULT_TEMPLATE_DIR})")
+    parser.add_argument("--from-template", nargs="?", const=str(DEFAULT_TEMPLATE_DIR), metavar="DIR",
+                        help="Create the environment by hardlink/reflink-cloning a verified template")
+    parser.add_argument("--report", metavar="FILE",
+                        help="Write a JSON summary (success, issues, fixes) to FILE")
+    parser.add_argument("--profile", choices=list(load_lock().get("profiles", [DEFAULT_PROFILE])),
+                        help="Install profile (default: cuda with an NVIDIA GPU, otherwise cpu, "
+                             "or no-torch when disk is short)")
+    parser.add_argument("--tune", action="store_true",
+                        help="Benchmark and save the best VapourSynth core threads/cache size for this CPU")
+    parser.add_argument("--event-log", metavar="FILE",
+                        help="JSONL log of every step (default: <install dir>_install_events.jsonl)")
+    args = parser.parse_args()
+    if args.build_template and args.from_template:
+        parser.error("--build-template and --from-template cannot be combined")
+    
+    installer = VapourSynthInstaller(offline=args.offline, wheelhouse=args.wheelhouse,
+                                     reconcile=args.reconcile,
+                                     install_dir=args.build_template or args.install_dir,
+                                     interactive=not args.non_interactive,
+                                     recreate=args.recreate, launcher_dir=args.launcher_dir,
+                                     template=args.from_template,
+                                     build_template=bool(args.build_template),
+                                     event_log=args.event_log, profile=args.profile,
+                                     tune=args.tune, cache_limit=args.cache_limit)
     success = installer.run()
     
-    input("\nPress Enter to exit...")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({
+                "success": success,
+                "install_dir": str(installer.install_dir),
+                "issues_found": installer.issues_found,
+                "fixes_applied": installer.fixes_applied,
+                "event_log": str(installer.event_log),
+                "profile": installer.profile_report,
+            }, f, indent=2)
+    
+    if installer.interactive:
+        input("\nPress Enter to exit...")
     sys.exit(0 if success else 1)
@@ -6,17 +6,369 @@ Tests your current setup AND simulates installation
 
 import os
 import sys
+import json
+import argparse
+import threading
+import importlib.metadata
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from pathlib import Path
 import time
 import subprocess
 
+from install_engine import (load_lock, lock_packages, locked_artifacts, platform_key,
+                            download_footprint, write_json_atomic, choose_profile)
+from platform_backend import get_backend
+
+IMPORT_TIMEOUT = 60
+GPU_TIMEOUT = 10
+# Hard limit for one whole check, its probe included
+CHECK_TIMEOUT = IMPORT_TIMEOUT + 10
+PROBE_CACHE_FILE = Path.home() / ".vapoursynth_probe_cache.json"
+PROBE_CACHE_TTL = 24 * 3600
+
+# Full import + functional checks, each run in its own interpreter so a
+# crashing vapoursynth or a slow CUDA init cannot take down the verifier
+IMPORT_CHECKS = {
+    "numpy": "import numpy; print(numpy.__version__)",
+    "torch": (
+        "import torch; print(torch.__version__); "
+        "print(torch.cuda.get_device_name(0) if torch.cuda.is_available() else '')"
+    ),
+    "vapoursynth": (
+        "import vapoursynth as vs; core = vs.core; "
+        "print(str(core.version()).replace(chr(10), ' ')); core.std.BlankClip()"
+    ),
+}
+
+
+def probe_version(dist_name):
+    """Read an installed version from dist-info metadata without importing it"""
+    try:
+        return importlib.metadata.version(dist_name)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+# Every probe is a separate process with its own timeout, so a hung
+# driver query or a slow torch import only holds up its own check
+PROBES = {name: [sys.executable, "-c", code] for name, code in IMPORT_CHECKS.items()}
+PROBES["gpu"] = ["nvidia-smi", "--query-gpu=name,driver_version", "--format=csv,noheader"]
+PROBE_TIMEOUTS = {"gpu": GPU_TIMEOUT}
+
+
+def run_probe(name, timeout=None):
+    """Run one probe subprocess and return (ok, output lines, seconds)"""
+    timeout = timeout or PROBE_TIMEOUTS.get(name, IMPORT_TIMEOUT)
+    start = time.perf_counter()
+    try:
+        result = subprocess.run(PROBES[name], capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return False, [f"timed out after {timeout}s"], time.perf_counter() - start
+    except OSError as e:
+        return False, [f"{PROBES[name][0]} not available: {e.strerror or e}"], time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines() or [f"exit code {result.returncode}"]
+        return False, lines[-1:], elapsed
+    return True, result.stdout.splitlines(), elapsed
+
+
+class ProbeCache:
+    """Successful probe results per interpreter and installed version, for a limited time
+
+    Failures and timeouts are never cached, so a fixed package or a
+    driver that has woken up is picked up on the next run.
+    """
+
+    def __init__(self, path=PROBE_CACHE_FILE, ttl=PROBE_CACHE_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.dirty = False
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def key(name):
+        return f"{sys.executable}|{name}|{probe_version(name)}"
+
+    def get(self, name):
+        with self.lock:
+            entry = self.entries.get(self.key(name))
+        if entry and time.time() - entry["time"] < self.ttl:
+            return tuple(entry["result"])
+        return None
+
+    def put(self, name, result):
+        if not result[0]:
+            return
+        with self.lock:
+            self.entries[self.key(name)] = {"time": time.time(), "result": list(result)}
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        now = time.time()
+        with self.lock:
+            self.entries = {k: e for k, e in self.entries.items() if now - e["time"] < self.ttl}
+            try:
+                write_json_atomic(self.path, self.entries)
+            except OSError:
+                pass
+            self.dirty = False
+
+
+# Where SVP4 and the player live comes from the same backend the installer uses;
+# an empty list means the backend does not support that check
+BACKEND = get_backend()
+SVP4_PATHS = BACKEND.svp4_candidates()
+PLAYER_PATHS = BACKEND.player_candidates()
+
+
+def check_result(name, version, status, lines, issues=(), **extra):
+    """Build the result of one check: status is ok, warning or critical"""
+    return {"name": name, "version": version, "status": status,
+            "lines": lines, "issues": list(issues), **extra}
+
+
+def check_python(imports):
+    """Python 3.10+ is required"""
+    py_version = sys.version_info
+    version = f"{py_version.major}.{py_version.minor}.{py_version.micro}"
+    lines = [f"Current: {version}"]
+    if py_version.major == 3 and py_version.minor >= 10:
+        lines.append("✅ Python 3.10+ - Good!")
+        return check_result("python", version, "ok", lines)
+    lines.append("❌ Need Python 3.10 or later")
+    return check_result("python", version, "critical", lines, ["Python version too old"])
+
+
+def check_numpy(imports):
+    """NumPy must be 1.26, never 2.x"""
+    version = probe_version("numpy")
+    if version is None:
+        return check_result("numpy", None, "warning",
+                            ["⚠️ NumPy not installed - will need to install"],
+                            ["NumPy not installed"])
+    
+    lines = [f"Found NumPy {version}"]
+    status, issues = "ok", []
+    if version.startswith("2."):
+        lines.append("❌ CRITICAL: NumPy 2.0 WILL BREAK VapourSynth!")
+        lines.append("You MUST downgrade: pip install numpy==1.26.4")
+        status = "critical"
+        issues.append("NumPy 2.0 detected - MUST downgrade")
+    elif version.startswith("1.26"):
+        lines.append("✅ NumPy 1.26 - Perfect!")
+    else:
+        lines.append(f"⚠️ NumPy {version} may have issues")
+        status = "warning"
+        issues.append(f"NumPy {version} untested")
+    
+    if "numpy" in imports:
+        ok, output, elapsed = imports["numpy"]
+        if ok:
+            lines.append(f"✅ NumPy imports cleanly ({elapsed:.1f}s)")
+        else:
+            lines.append(f"❌ NumPy import failed: {output[0]}")
+            status = "critical"
+            issues.append("NumPy import failed")
+    return check_result("numpy", version, status, lines, issues)
+
+
+def check_torch(imports):
+    """PyTorch should be the CUDA 11.8 build"""
+    version = probe_version("torch")
+    if version is None:
+        return check_result("torch", None, "ok",
+                            ["⚠️ PyTorch not installed - optional but recommended"])
+    
+    lines = [f"Found PyTorch {version}"]
+    status, issues, cuda_device = "ok", [], None
+    if "+cu118" in version:
+        lines.append("✅ CUDA 11.8 build - Good!")
+    elif "+cu12" in version:
+        lines.append("⚠️ CUDA 12.x build may have issues")
+        status = "warning"
+        issues.append("PyTorch CUDA 12 may conflict")
+    elif "+cpu" in version:
+        lines.append("ℹ️ CPU-only build (cpu install profile)")
+    
+    if "torch" in imports:
+        ok, output, elapsed = imports["torch"]
+        if not ok:
+            lines.append(f"❌ PyTorch import failed: {output[0]}")
+            status = "warning"
+            issues.append("PyTorch import failed")
+        elif len(output) > 1 and output[1]:
+            cuda_device = output[1]
+            lines.append(f"✅ CUDA available: {cuda_device} ({elapsed:.1f}s)")
+        else:
+            lines.append(f"⚠️ CUDA not detected ({elapsed:.1f}s)")
+    else:
+        lines.append("ℹ️ CUDA check skipped (run with --full)")
+    return check_result("torch", version, status, lines, issues, cuda_device=cuda_device)
+
+
+def check_vapoursynth(imports):
+    """VapourSynth must be R72 with a working core"""
+    version = probe_version("vapoursynth")
+    if version is None:
+        return check_result("vapoursynth", None, "warning",
+                            ["⚠️ VapourSynth not installed"],
+                            ["VapourSynth not installed"])
+    
+    lines = [f"Found VapourSynth R{version}"]
+    status, issues = "ok", []
+    release = version.split(".")[0]
+    if release == "72":
+        lines.append("✅ VapourSynth R72 - Perfect!")
+    elif release.isdigit() and int(release) >= 73:
+        lines.append("⚠️ VapourSynth R73+ may have compatibility issues")
+        status = "warning"
+        issues.append("VapourSynth R73+ may have issues")
+    
+    if "vapoursynth" in imports:
+        ok, output, elapsed = imports["vapoursynth"]
+        if ok:
+            lines.append(f"✅ VapourSynth core is functional ({elapsed:.1f}s)")
+        else:
+            lines.append(f"❌ VapourSynth error: {output[0]}")
+            status = "critical"
+            issues.append("VapourSynth core malfunction")
+    else:
+        lines.append("ℹ️ Core functional test skipped (run with --full)")
+    return check_result("vapoursynth", version, status, lines, issues)
+
+
+def check_gpu(imports):
+    """An NVIDIA GPU is optional; without one the cpu install profile is used"""
+    ok, output, elapsed = imports.get("gpu", (False, ["not checked"], 0.0))
+    if ok and output:
+        gpu_name, _, driver = output[0].partition(", ")
+        return check_result("gpu", driver or None, "ok",
+                            [f"✅ NVIDIA GPU: {gpu_name} (driver {driver or '?'}, {elapsed:.1f}s)"],
+                            gpu=gpu_name)
+    return check_result("gpu", None, "ok",
+                        [f"⚠️ No NVIDIA GPU ({output[0] if output else 'no devices'}) - "
+                         "CPU-only install profile"], gpu=None)
+
+
+def skipped_check(name, what):
+    """Result of a check the platform backend has nothing to look for"""
+    return check_result(name, None, "ok", [f"⏭️ {what} check skipped on {BACKEND.name}"], path=None)
+
+
+def check_svp4(imports):
+    """SVP4 Manager must be installed"""
+    if not SVP4_PATHS:
+        return skipped_check("svp4", "SVP4")
+    for path in SVP4_PATHS:
+        if path.exists():
+            return check_result("svp4", None, "ok", [f"✅ SVP4 found: {path}"], path=str(path))
+    return check_result("svp4", None, "warning",
+                        [f"❌ SVP4 not found - Download from {BACKEND.svp4_url}"],
+                        ["SVP4 not installed"], path=None)
+
+
+def check_player(imports):
+    """The video player (PotPlayer on Windows, mpv on Linux) is optional"""
+    player = BACKEND.player_name
+    if not PLAYER_PATHS:
+        return skipped_check("player", player)
+    for path in PLAYER_PATHS:
+        if path.exists():
+            return check_result("player", None, "ok", [f"✅ {player} found: {path}"], path=str(path))
+    return check_result("player", None, "ok",
+                        [f"⚠️ {player} not found (optional)",
+                         f"Download from: {BACKEND.player_url}"], path=None)
+
+
+# (title, check, probe it needs or None)
+CHECKS = [
+    ("Python Version", check_python, None),
+    ("NumPy Check", check_numpy, "numpy"),
+    ("PyTorch Check", check_torch, "torch"),
+    ("VapourSynth Check", check_vapoursynth, "vapoursynth"),
+    ("NVIDIA GPU Check", check_gpu, "gpu"),
+    ("SVP4 Check", check_svp4, None),
+    (f"{BACKEND.player_name} Check", check_player, None),
+]
+
+
+def wants_probe(probe, full_check):
+    """Import probes only run with --full and only for installed packages"""
+    if probe is None:
+        return False
+    if probe in IMPORT_CHECKS:
+        return full_check and probe_version(probe) is not None
+    return True
+
+
+def run_check(title, check, probe, full_check, cache):
+    """Run one check, with its probe from the cache or a fresh subprocess"""
+    start = time.perf_counter()
+    imports, cached = {}, False
+    if wants_probe(probe, full_check):
+        outcome = cache.get(probe) if cache else None
+        cached = outcome is not None
+        if outcome is None:
+            outcome = run_probe(probe)
+            if cache:
+                cache.put(probe, outcome)
+        imports[probe] = outcome
+    result = check(imports)
+    result["title"] = title
+    result["cached"] = cached
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def run_checks(full_check=False, cache=None, timeout=CHECK_TIMEOUT):
+    """Run every environment check concurrently and return one result dict per check
+
+    Total time is that of the slowest check; a check still running
+    after timeout seconds is reported as timed out instead of waited on.
+    """
+    pool = ThreadPoolExecutor(max_workers=len(CHECKS))
+    futures = [pool.submit(run_check, title, check, probe, full_check, cache)
+               for title, check, probe in CHECKS]
+    deadline = time.perf_counter() + timeout
+    
+    results = []
+    for (title, check, probe), future in zip(CHECKS, futures):
+        name = check.__name__.replace("check_", "", 1)
+        try:
+            result = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+        except FutureTimeout:
+            result = check_result(name, None, "warning", [f"⏱️ {title} timed out after {timeout}s"],
+                                  [f"{title} timed out"])
+            result.update(title=title, cached=False, seconds=float(timeout))
+        except Exception as e:
+            result = check_result(name, None, "warning", [f"❌ {title} crashed: {e}"],
+                                  [f"{title} crashed"])
+            result.update(title=title, cached=False, seconds=0.0)
+        results.append(result)
+    pool.shutdown(wait=False, cancel_futures=True)
+    if cache:
+        cache.save()
+    return results
+
+
 class VapourSynthInstallerTest:
-    def __init__(self):
+    def __init__(self, full_check=False, use_cache=True):
         self.home = Path.home()
         self.install_dir = self.home / "VapourSynth_Environment_TEST"
         self.issues_found = []
         self.fixes_applied = []
         self.current_setup_works = True
+        self.full_check = full_check
+        self.use_cache = use_cache
+        self.gpu = False
         
     def verify_current_setup(self):
         """Check if user's current Python setup would work"""
@@ -24,124 +376,31 @@ class VapourSynthInstallerTest:
         print("VERIFYING YOUR CURRENT SETUP")
         print("="*60)
         
-        # Check Python version
-        print(f"\n1. Python Version:")
-        py_version = sys.version_info
-        print(f"   Current: {py_version.major}.{py_version.minor}.{py_version.micro}")
-        if py_version.major == 3 and py_version.minor >= 10:
-            print("   ✅ Python 3.10+ - Good!")
-        else:
-            print("   ❌ Need Python 3.10 or later")
-            self.current_setup_works = False
-            self.issues_found.append("Python version too old")
-        
-        # Check NumPy
-        print(f"\n2. NumPy Check:")
-        try:
-            import numpy as np
-            print(f"   Found NumPy {np.__version__}")
-            if np.__version__.startswith("2."):
-                print("   ❌ CRITICAL: NumPy 2.0 WILL BREAK VapourSynth!")
-                print("   You MUST downgrade: pip install numpy==1.26.4")
-                self.current_setup_works = False
-                self.issues_found.append("NumPy 2.0 detected - MUST downgrade")
-            elif np.__version__.startswith("1.26"):
-                print("   ✅ NumPy 1.26 - Perfect!")
-            else:
-                print(f"   ⚠️ NumPy {np.__version__} may have issues")
-                self.issues_found.append(f"NumPy {np.__version__} untested")
-        except ImportError:
-            print("   ⚠️ NumPy not installed - will need to install")
-            self.issues_found.append("NumPy not installed")
-        
-        # Check PyTorch
-        print(f"\n3. PyTorch Check:")
-        try:
-            import torch
-            print(f"   Found PyTorch {torch.__version__}")
-            if "+cu118" in torch.__version__:
-                print("   ✅ CUDA 11.8 build - Good!")
-            elif "+cu12" in torch.__version__:
-                print("   ⚠️ CUDA 12.x build may have issues")
-                self.issues_found.append("PyTorch CUDA 12 may conflict")
-            
-            if torch.cuda.is_available():
-                print(f"   ✅ CUDA available: {torch.cuda.get_device_name(0)}")
-            else:
-                print("   ⚠️ CUDA not detected")
-        except ImportError:
-            print("   ⚠️ PyTorch not installed - optional but recommended")
-        
-        # Check VapourSynth
-        print(f"\n4. VapourSynth Check:")
-        try:
-            import vapoursynth as vs
-            core = vs.core
-            vs_info = str(core.version())
-            print(f"   Found VapourSynth: {vs_info}")
-            
-            if "R72" in vs_info:
-                print("   ✅ VapourSynth R72 - Perfect!")
-            elif "R73" in vs_info or "R74" in vs_info:
-                print("   ⚠️ VapourSynth R73+ may have compatibility issues")
-                self.issues_found.append("VapourSynth R73+ may have issues")
-            
-            # Test basic functionality
-            try:
-                test_clip = core.std.BlankClip()
-                print("   ✅ VapourSynth core is functional")
-            except:
-                print("   ❌ VapourSynth core not working properly")
+        # Versions come from metadata; imports only happen with --full.
+        # All checks run at once, each probe in its own subprocess
+        if self.full_check:
+            print("\n(running import checks in parallel subprocesses...)")
+        start = time.perf_counter()
+        results = run_checks(self.full_check, ProbeCache() if self.use_cache else None)
+        elapsed = time.perf_counter() - start
+        
+        for number, result in enumerate(results, 1):
+            print(f"\n{number}. {result['title']}:")
+            for line in result["lines"]:
+                print(f"   {line}")
+            self.issues_found.extend(result["issues"])
+            if result["status"] == "critical":
                 self.current_setup_works = False
-                self.issues_found.append("VapourSynth core malfunction")
-                
-        except ImportError:
-            print("   ⚠️ VapourSynth not installed")
-            self.issues_found.append("VapourSynth not installed")
-        except Exception as e:
-            print(f"   ❌ VapourSynth error: {e}")
-            self.current_setup_works = False
-            self.issues_found.append(f"VapourSynth error: {e}")
         
-        # Check for SVP4
-        print(f"\n5. SVP4 Check:")
-        svp4_paths = [
-            Path(r"C:\Program Files (x86)\SVP 4\SVPManager.exe"),
-            Path(r"C:\Program Files\SVP 4\SVPManager.exe")
-        ]
+        # Fall back to the backend's default install locations for the launcher
+        paths = {result["name"]: result.get("path") for result in results}
+        self.svp4_path = paths["svp4"] or next(iter(SVP4_PATHS), None)
+        self.player_path = paths["player"] or next(iter(PLAYER_PATHS), None)
         
-        svp4_found = False
-        for path in svp4_paths:
-            if path.exists():
-                print(f"   ✅ SVP4 found: {path}")
-                svp4_found = True
-                self.svp4_path = path
-                break
-        
-        if not svp4_found:
-            print("   ❌ SVP4 not found - Download from svp-team.com")
-            self.issues_found.append("SVP4 not installed")
-            self.svp4_path = Path(r"C:\Program Files (x86)\SVP 4\SVPManager.exe")
-        
-        # Check for PotPlayer
-        print(f"\n6. PotPlayer Check:")
-        potplayer_paths = [
-            Path(r"C:\Program Files\DAUM\PotPlayer\PotPlayerMini64.exe"),
-            Path(r"C:\Program Files (x86)\DAUM\PotPlayer\PotPlayerMini64.exe")
-        ]
-        
-        potplayer_found = False
-        for path in potplayer_paths:
-            if path.exists():
-                print(f"   ✅ PotPlayer found: {path}")
-                potplayer_found = True
-                self.potplayer_path = path
-                break
-                
-        if not potplayer_found:
-            print("   ⚠️ PotPlayer not found (optional)")
-            print("   Download from: potplayer.daum.net")
-            self.potplayer_path = Path(r"C:\Program Files\DAUM\PotPlayer\PotPlayerMini64.exe")
+        cached = sum(result["cached"] for result in results)
+        print(f"\n⏱️ {len(results)} checks in {elapsed:.1f}s "
+              f"(slowest {max(r['seconds'] for r in results):.1f}s, "
+              f"sum {sum(r['seconds'] for r in results):.1f}s, {cached} from cache)")
         
         # Summary
         print("\n" + "="*60)
@@ -155,6 +414,8 @@ class VapourSynthInstallerTest:
             print("\n⚠️ YOUR SETUP MAY WORK but has warnings:")
             for issue in self.issues_found:
                 print(f"   - {issue}")
+            print("\n💡 python abi_matrix.py --wheelhouse <dir> tests which numpy / vapoursynth")
+            print("   versions actually work (and how fast) instead of relying on the pins")
         else:
             print("\n❌ YOUR SETUP WILL NOT WORK! Critical issues found:")
             for issue in self.issues_found:
@@ -180,6 +441,7 @@ class VapourSynthInstallerTest:
         try:
             result = subprocess.run(['nvidia-smi', '--query-gpu=name', '--format=csv,noheader'], 
                                   capture_output=True, text=True, timeout=2)
+            self.gpu = result.returncode == 0
             if result.returncode == 0:
                 gpu_name = result.stdout.strip()
                 print(f"✅ NVIDIA GPU detected: {gpu_name}")
@@ -210,18 +472,28 @@ class VapourSynthInstallerTest:
         print("\n📥 SIMULATING package installation...")
         print("⚠️ REMEMBER: NEVER UPDATE THESE PACKAGES!")
         
-        packages = [
-            ("numpy", "1.26.4", "CRITICAL: Must be 1.26.4, NOT 2.0!"),
-            ("torch", "2.7.0+cu118", "CUDA 11.8 build for compatibility"),
-            ("vapoursynth", "72", "R72 is the stable version, NOT R73!"),
-        ]
+        lock = load_lock()
+        profile, reason = choose_profile(lock, self.gpu, self.install_dir)
+        print(f"\n🧩 Install profiles (real installer would pick {profile}: {reason}):")
+        for name, settings in lock.get("profiles", {}).items():
+            footprint = download_footprint(locked_artifacts(lock, profile=name))
+            size = f"{footprint / 1e9:.2f} GB download" if footprint is not None else "size unknown (not locked)"
+            marker = "👉" if name == profile else "  "
+            print(f"  {marker} {name:<9} {size:<28} {settings.get('note', '')}")
+        
+        locked = locked_artifacts(lock, profile=profile)
+        key = platform_key(profile=profile)
+        if locked is None:
+            print(f"ℹ️ Lock file has no wheels for {key} - real installer would resolve")
+        else:
+            print(f"🔒 Lock file pins {len(locked)} wheels for {key}")
         
-        for package, version, note in packages:
-            print(f"\nSIMULATING install {package}=={version}")
-            print(f"  ⚠️ {note}")
+        for package in lock_packages(lock, profile):
+            print(f"\nSIMULATING install {package['name']}=={package['version']}")
+            print(f"  ⚠️ {package['note']}")
             time.sleep(0.5)
-            print(f"  ✅ {package} installed successfully (TEST)")
-            self.fixes_applied.append(f"Installed {package} {version}")
+            print(f"  ✅ {package['name']} installed successfully (TEST)")
+            self.fixes_applied.append(f"Installed {package['name']} {package['version']}")
     
     def create_launcher(self):
         """Create TEST launcher script with warnings"""
@@ -243,7 +515,7 @@ echo THIS IS A TEST VERSION
 echo Real version would:
 echo - Activate virtual environment at {self.install_dir}
 echo - Start SVP4 at {self.svp4_path}
-echo - Start PotPlayer at {self.potplayer_path}
+echo - Start {BACKEND.player_name} at {self.player_path}
 echo.
 pause
 """
@@ -297,7 +569,14 @@ pause
         return True
 
 if __name__ == "__main__":
-    installer = VapourSynthInstallerTest()
+    parser = argparse.ArgumentParser(description="VapourSynth Installer TEST MODE")
+    parser.add_argument("--full", action="store_true",
+                        help="Also import each package and test VapourSynth core (slower)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Re-run every probe instead of reusing {PROBE_CACHE_FILE}")
+    args = parser.parse_args()
+    
+    installer = VapourSynthInstallerTest(full_check=args.full, use_cache=not args.no_cache)
     success = installer.run()
     
     input("\nPress Enter to exit TEST MODE...")
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+NumPy / VapourSynth / Python compatibility matrix
+Builds a throwaway venv for every combination of candidate versions,
+installing only from a local wheelhouse, then runs the functional import
+checks and the test_setup.py frame throughput benchmark in each one. The
+result is a table of which combinations work and how fast they are next
+to the pinned versions in packages.lock.json:
+
+    python abi_matrix.py --wheelhouse wheels --numpy 1.26.4 2.0.2 2.1.3 --vapoursynth 72 73
+
+Environments are built and import-checked in parallel; the benchmarks
+run one at a time so they do not compete for the CPU.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import itertools
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from install_engine import load_lock, lock_packages, canonical_name
+from platform_backend import get_backend
+from VapourSynth_Installer import TEST_SCRIPT
+from VapourSynth_Installer_TEST import IMPORT_CHECKS, IMPORT_TIMEOUT
+
+MATRIX_PACKAGES = ["numpy", "vapoursynth"]
+DEFAULT_CASES = ["720p:YUV420P8", "1080p:YUV420P16"]
+INSTALL_TIMEOUT = 900
+BENCHMARK_TIMEOUT = 600
+DIST_SUFFIXES = (".whl", ".tar.gz", ".zip")
+
+
+def parse_dist(filename):
+    """(canonical name, version) of a wheel or sdist filename, or None"""
+    for suffix in DIST_SUFFIXES:
+        if filename.endswith(suffix):
+            stem = filename[:-len(suffix)]
+            break
+    else:
+        return None
+    if filename.endswith(".whl"):
+        parts = stem.split("-")
+        return (canonical_name(parts[0]), parts[1]) if len(parts) >= 5 else None
+    match = re.match(r"^(.+?)-(\d[^-]*)$", stem)
+    return (canonical_name(match.group(1)), match.group(2)) if match else None
+
+
+def scan_wheelhouse(wheelhouse):
+    """Directories holding distributions, and the versions available per package
+
+    Works for a flat folder of wheels as well as a WheelCache, whose
+    wheels sit one directory deeper.
+    """
+    links, versions = set(), {}
+    for path in Path(wheelhouse).rglob("*"):
+        dist = parse_dist(path.name) if path.is_file() else None
+        if dist is None:
+            continue
+        links.add(path.parent)
+        versions.setdefault(dist[0], set()).add(dist[1])
+    return sorted(links), versions
+
+
+def version_key(version):
+    return [int(part) if part.isdigit() else part for part in re.split(r"[.+-]", version)]
+
+
+def find_python(spec):
+    """Interpreter for a version like 3.12, or a path; returns (path, "3.12") or None"""
+    candidates = []
+    if Path(spec).exists():
+        candidates.append([spec])
+    else:
+        if os.name == "nt" and shutil.which("py"):
+            candidates.append(["py", f"-{spec}"])
+        for name in (f"python{spec}", f"python{spec.split('.')[0]}", "python"):
+            if shutil.which(name):
+                candidates.append([shutil.which(name)])
+
+    for cmd in candidates:
+        try:
+            result = subprocess.run(
+                cmd + ["-c", "import sys; print(sys.executable); print('%d.%d' % sys.version_info[:2])"],
+                capture_output=True, text=True, timeout=30)
+        except (OSError, subprocess.TimeoutExpired):
+            continue
+        if result.returncode != 0:
+            continue
+        executable, version = result.stdout.split()[-2:]
+        if Path(spec).exists() or version == spec:
+            return executable, version
+    return None
+
+
+def last_line(text):
+    """Most useful line of a failed command's output
+
+    pip's first ERROR: line names the cause; for a traceback it is the last
+    line (e.g. "ImportError: numpy.core.multiarray failed to import").
+    """
+    lines = [line.strip() for line in (text or "").splitlines()
+             if line.strip() and not line.lstrip().startswith(("note:", "hint:"))]
+    pip_errors = [line for line in lines if line.startswith("ERROR:")]
+    if pip_errors:
+        return pip_errors[0][:120]
+    return (lines or ["no output"])[-1][:120]
+
+
+class StepFailed(Exception):
+    def __init__(self, status, error):
+        super().__init__(error)
+        self.status = status
+        self.error = error
+
+
+class MatrixRunner:
+    """Builds and measures one environment per (python, numpy, vapoursynth) combination"""
+
+    def __init__(self, links, work_dir, cases=DEFAULT_CASES, frames=200, keep=False):
+        self.links = links
+        self.work_dir = Path(work_dir)
+        self.cases = cases
+        self.frames = frames
+        self.keep = keep
+        self.backend = get_backend()
+        self.benchmark_lock = threading.Lock()
+
+    def run(self, python, python_version, versions):
+        """Build, check and benchmark one combination; returns a result dict"""
+        label = "-".join([f"py{python_version}"] + [f"{name}{versions[name]}" for name in MATRIX_PACKAGES])
+        env_dir = self.work_dir / label
+        result = {"python": python_version, **versions, "status": "ok", "error": None,
+                  "seconds": {}, "fps": {}}
+        try:
+            self.build(python, env_dir, versions, result)
+            python_exe = self.backend.venv_paths(env_dir)["python"]
+            self.check_imports(python_exe, result)
+            self.benchmark(python_exe, env_dir, result)
+        except StepFailed as e:
+            result["status"], result["error"] = e.status, e.error
+        finally:
+            if not self.keep:
+                shutil.rmtree(env_dir, ignore_errors=True)
+        return result
+
+    def step(self, result, name, cmd, timeout, status):
+        """Run one command of a combination, raising StepFailed on error"""
+        start = time.perf_counter()
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise StepFailed(status, f"{name} timed out after {timeout}s")
+        finally:
+            result["seconds"][name] = round(result["seconds"].get(name, 0)
+                                            + time.perf_counter() - start, 2)
+        if proc.returncode != 0:
+            raise StepFailed(status, last_line(proc.stderr or proc.stdout))
+        return proc.stdout
+
+    def build(self, python, env_dir, versions, result):
+        shutil.rmtree(env_dir, ignore_errors=True)
+        self.step(result, "venv", [python, "-m", "venv", str(env_dir)], INSTALL_TIMEOUT,
+                  "venv failed")
+        python_exe = self.backend.venv_paths(env_dir)["python"]
+        find_links = [arg for link in self.links for arg in ("--find-links", str(link))]
+        requirements = [f"{name}=={versions[name]}" for name in MATRIX_PACKAGES]
+        self.step(result, "install",
+                  [str(python_exe), "-m", "pip", "install", "--no-index", "--disable-pip-version-check",
+                   "--quiet", *find_links, *requirements],
+                  INSTALL_TIMEOUT, "install failed")
+
+    def check_imports(self, python_exe, result):
+        """The verifier's import checks, each in its own interpreter"""
+        for name in MATRIX_PACKAGES:
+            self.step(result, "imports", [str(python_exe), "-c", IMPORT_CHECKS[name]],
+                      IMPORT_TIMEOUT, "import failed")
+
+    def benchmark(self, python_exe, env_dir, result):
+        """test_setup.py --benchmark-case for each case, one combination at a time"""
+        script = env_dir / "test_setup.py"
+        script.write_text(TEST_SCRIPT)
+        with self.benchmark_lock:
+            for case in self.cases:
+                output = self.step(result, "benchmark",
+                                   [str(python_exe), str(script), "--benchmark-case", case,
+                                    "--frames", str(self.frames)],
+                                   BENCHMARK_TIMEOUT, "benchmark failed")
+                try:
+                    result["fps"][case] = round(json.loads(output)["fps"], 1)
+                except (ValueError, KeyError):
+                    raise StepFailed("benchmark failed", f"{case}: {last_line(output)}")
+
+
+def pinned_versions():
+    """Versions of the matrix packages pinned in packages.lock.json"""
+    return {package["name"]: package["version"] for package in lock_packages(load_lock())
+            if package["name"] in MATRIX_PACKAGES}
+
+
+def is_pinned(result, pinned):
+    return all(result[name] == pinned.get(name) for name in MATRIX_PACKAGES)
+
+
+def print_table(results, cases, pinned):
+    """Compatibility and throughput table, with speed relative to the pinned combination"""
+    baseline = next((r for r in results if is_pinned(r, pinned) and r["status"] == "ok"), None)
+
+    print("\n" + "="*60)
+    print("NUMPY / VAPOURSYNTH COMPATIBILITY MATRIX")
+    print("="*60)
+    header = f"  {'python':<8}{'numpy':<10}{'vapoursynth':<13}{'status':<18}"
+    header += "".join(f"{case:>18}" for case in cases)
+    print(header)
+    for r in results:
+        marker = "★" if is_pinned(r, pinned) else " "
+        line = f"{marker} {r['python']:<8}{r['numpy']:<10}{r['vapoursynth']:<13}{r['status']:<18}"
+        for case in cases:
+            fps = r["fps"].get(case)
+            if fps is None:
+                cell = "-"
+            elif baseline and baseline is not r and baseline["fps"].get(case):
+                cell = f"{fps:.0f} ({fps / baseline['fps'][case] - 1:+.0%})"
+            else:
+                cell = f"{fps:.0f}"
+            line += f"{cell:>18}"
+        print(line)
+        if r["error"]:
+            print(f"      ↳ {r['error']}")
+
+    print(f"\n  ★ = pinned in packages.lock.json (numpy {pinned.get('numpy')}, "
+          f"vapoursynth {pinned.get('vapoursynth')}); fps in frames/s, change vs pinned")
+    working = [r for r in results if r["status"] == "ok"]
+    print(f"  {len(working)}/{len(results)} combinations work")
+    if working and cases:
+        best = max(working, key=lambda r: r["fps"].get(cases[0], 0))
+        print(f"  Fastest at {cases[0]}: Python {best['python']}, numpy {best['numpy']}, "
+              f"vapoursynth {best['vapoursynth']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test numpy / vapoursynth / Python combinations")
+    parser.add_argument("--wheelhouse", type=Path, required=True,
+                        help="Folder (or wheel cache) with every wheel needed; nothing is downloaded")
+    parser.add_argument("--numpy", nargs="+", metavar="VERSION",
+                        help="NumPy versions to try (default: every one in the wheelhouse)")
+    parser.add_argument("--vapoursynth", nargs="+", metavar="VERSION",
+                        help="VapourSynth versions to try (default: every one in the wheelhouse)")
+    parser.add_argument("--python", nargs="+", metavar="VERSION_OR_PATH",
+                        default=[f"{sys.version_info.major}.{sys.version_info.minor}"],
+                        help="Interpreters to try, e.g. 3.11 3.12 (default: this one)")
+    parser.add_argument("--cases", nargs="+", default=DEFAULT_CASES, metavar="RES:FORMAT",
+                        help=f"Throughput cases (default: {' '.join(DEFAULT_CASES)})")
+    parser.add_argument("--frames", type=int, default=200, help="Frames per throughput case")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 4,
+                        help="Environments built at the same time")
+    parser.add_argument("--work-dir", type=Path,
+                        help="Where to build the environments (default: a temporary folder)")
+    parser.add_argument("--keep", action="store_true", help="Keep the environments afterwards")
+    parser.add_argument("--json", type=Path, help="Also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    links, available = scan_wheelhouse(args.wheelhouse)
+    candidates = {}
+    for name in MATRIX_PACKAGES:
+        versions = getattr(args, name) or sorted(available.get(name, []), key=version_key)
+        if not versions:
+            print(f"❌ No {name} distributions in {args.wheelhouse}")
+            return 1
+        candidates[name] = versions
+
+    pythons = []
+    for spec in args.python:
+        found = find_python(spec)
+        if found is None:
+            print(f"⚠️  Python {spec} not found - skipped")
+        else:
+            pythons.append(found)
+    if not pythons:
+        print("❌ No usable Python interpreters")
+        return 1
+
+    combos = [(python, version, dict(zip(MATRIX_PACKAGES, values)))
+              for (python, version), *values in itertools.product(pythons, *candidates.values())]
+    print(f"🧪 {len(combos)} combinations, {args.jobs} environments at a time")
+
+    work_dir = args.work_dir or Path(tempfile.mkdtemp(prefix="vs_abi_matrix_"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    runner = MatrixRunner(links, work_dir, args.cases, args.frames, args.keep)
+    start = time.perf_counter()
+    results = []
+    try:
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            futures = [pool.submit(runner.run, *combo) for combo in combos]
+            for future in as_completed(futures):
+                r = future.result()
+                icon = "✅" if r["status"] == "ok" else "❌"
+                print(f"{icon} Python {r['python']} / numpy {r['numpy']} / "
+                      f"vapoursynth {r['vapoursynth']}: {r['status']}")
+                results.append(r)
+    finally:
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    order = {name: {v: i for i, v in enumerate(values)} for name, values in candidates.items()}
+    results.sort(key=lambda r: (version_key(r["python"]),
+                                *(order[name][r[name]] for name in MATRIX_PACKAGES)))
+    pinned = pinned_versions()
+    print_table(results, args.cases, pinned)
+    print(f"\n  {time.perf_counter() - start:.1f}s total")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"pinned": pinned, "cases": args.cases, "frames": args.frames,
+                       "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
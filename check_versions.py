@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+VapourSynth environment diagnostics
+Runs the same checks as VapourSynth_Installer_TEST.py and prints a JSON
+report. Results are cached against the dist-info mtimes of every
+site-packages directory for up to a day, so polling an unchanged
+environment is instant while GPU and driver results still get re-checked.
+"""
+
+import sys
+import json
+import site
+import time
+import hashlib
+import argparse
+from pathlib import Path
+
+from install_engine import write_json_atomic
+from VapourSynth_Installer_TEST import (run_checks, ProbeCache, PROBE_CACHE_TTL, SVP4_PATHS,
+                                        PLAYER_PATHS)
+
+REPORT_VERSION = 3
+DEFAULT_CACHE_FILE = Path.home() / ".vapoursynth_check_cache.json"
+
+
+def site_packages_dirs():
+    """Every site-packages directory the current interpreter imports from"""
+    dirs = list(site.getsitepackages())
+    if site.ENABLE_USER_SITE:
+        dirs.append(site.getusersitepackages())
+    return [Path(d) for d in dirs if Path(d).is_dir()]
+
+
+def environment_key(full_check):
+    """Fingerprint of the environment: dist-info mtimes plus player paths"""
+    digest = hashlib.sha256()
+    digest.update(f"{REPORT_VERSION}|{sys.executable}|{full_check}".encode())
+    for directory in site_packages_dirs():
+        digest.update(f"{directory}|{directory.stat().st_mtime_ns}".encode())
+        for entry in sorted(directory.glob("*.dist-info")) + sorted(directory.glob("*.egg-info")):
+            digest.update(f"{entry.name}|{entry.stat().st_mtime_ns}".encode())
+    for path in SVP4_PATHS + PLAYER_PATHS:
+        digest.update(f"{path}|{path.exists()}".encode())
+    return digest.hexdigest()
+
+
+def load_cached(cache_file, key, ttl=PROBE_CACHE_TTL):
+    """Return the cached report for this environment key if younger than ttl seconds, or None
+
+    Package versions are in the key, but GPU and driver results are not,
+    so reports expire like the probe cache does.
+    """
+    try:
+        with open(cache_file) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get("key") != key or time.time() - cached.get("time", 0) >= ttl:
+        return None
+    return cached["report"]
+
+
+def save_cached(cache_file, key, report):
+    """Store a report for this environment key, atomically so concurrent runs never tear it"""
+    try:
+        write_json_atomic(cache_file, {"key": key, "time": time.time(), "report": report})
+    except OSError:
+        pass
+
+
+def build_report(full_check, probe_cache=None):
+    """Run every check and shape the results as a JSON-ready report"""
+    start = time.perf_counter()
+    checks = []
+    for result in run_checks(full_check, probe_cache):
+        checks.append({
+            "name": result["name"],
+            "title": result["title"],
+            "version": result["version"],
+            "status": result["status"],
+            "passed": result["status"] != "critical",
+            "issues": result["issues"],
+            "seconds": round(result["seconds"], 4),
+            "cached": result["cached"],
+            "messages": result["lines"],
+            **{k: result[k] for k in ("path", "cuda_device", "gpu") if k in result},
+        })
+    return {
+        "report_version": REPORT_VERSION,
+        "python": sys.executable,
+        "full_check": full_check,
+        "generated_at": time.time(),
+        "passed": all(check["passed"] for check in checks),
+        "seconds": round(time.perf_counter() - start, 4),
+        "checks": checks,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VapourSynth environment diagnostics (JSON)")
+    parser.add_argument("--full", action="store_true",
+                        help="Also import each package and test VapourSynth core")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore and do not update the report and probe caches")
+    parser.add_argument("--cache-file", type=Path, default=DEFAULT_CACHE_FILE,
+                        help=f"Result cache location (default: {DEFAULT_CACHE_FILE})")
+    parser.add_argument("--indent", type=int, default=None,
+                        help="Pretty-print the JSON with this indent")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    key = environment_key(args.full)
+    report = None if args.no_cache else load_cached(args.cache_file, key)
+    cached = report is not None
+    if report is None:
+        report = build_report(args.full, None if args.no_cache else ProbeCache())
+        if not args.no_cache:
+            save_cached(args.cache_file, key, report)
+
+    report["cached"] = cached
+    report["elapsed"] = round(time.perf_counter() - start, 4)
+    print(json.dumps(report, indent=args.indent))
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Structured install event log
+Every installer step is recorded as a span with start/end timestamps,
+plus whatever it measured (bytes downloaded, exit codes, packages), one
+JSON object per line. The summary is a flame-style tree of where the
+wall time went, so a slow install can be diagnosed from its log alone:
+
+    python event_log.py ~/VapourSynth_Environment_install_events.jsonl
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import threading
+from contextlib import contextmanager
+
+BAR_WIDTH = 30
+
+
+class EventLog:
+    """Collects spans and point events, appending them to a JSONL file if given"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.events = []
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.local = threading.local()
+        self.file = None
+        if path is not None:
+            self.file = open(path, "w", encoding="utf-8")
+
+    def stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def current(self):
+        """Id of the innermost open span on this thread, or None"""
+        stack = self.stack()
+        return stack[-1] if stack else None
+
+    def emit(self, event, **fields):
+        """Record one event"""
+        record = {"event": event, "ts": time.time(), "pid": os.getpid(), **fields}
+        with self.lock:
+            self.events.append(record)
+            if self.file is not None:
+                self.file.write(json.dumps(record, default=str) + "\n")
+                self.file.flush()
+        return record
+
+    @contextmanager
+    def span(self, name, parent=None, **fields):
+        """Time a block; the yielded dict is logged with the end event
+
+        parent defaults to the innermost span on this thread. Worker
+        threads pass the id of the span that started them explicitly.
+        """
+        span_id = next(self.ids)
+        parent = parent if parent is not None else self.current()
+        self.emit("start", span=span_id, parent=parent, name=name, **fields)
+        result = dict(fields)
+        stack = self.stack()
+        stack.append(span_id)
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield result
+        except BaseException as e:
+            status = "error"
+            result.setdefault("error", str(e) or type(e).__name__)
+            raise
+        finally:
+            stack.pop()
+            self.emit("end", span=span_id, parent=parent, name=name, status=status,
+                      seconds=round(time.perf_counter() - start, 6), **result)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def load_events(path):
+    """Read a JSONL event log, skipping a torn last line"""
+    events = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                pass
+    return events
+
+
+def span_tree(events):
+    """Finished spans keyed by parent id; unfinished spans are closed at the last event"""
+    ends = {e["span"]: e for e in events if e["event"] == "end"}
+    last_ts = max((e["ts"] for e in events), default=0)
+    children = {}
+    for e in events:
+        if e["event"] != "start":
+            continue
+        span = ends.get(e["span"])
+        if span is None:
+            span = dict(e, status="unfinished", seconds=last_ts - e["ts"])
+        children.setdefault(e.get("parent"), []).append(span)
+    return children
+
+
+def describe(span):
+    """Short extra info for one span line"""
+    parts = []
+    if span.get("bytes"):
+        parts.append(f"{span['bytes'] / 1e6:.1f} MB")
+    if span.get("exit_code") not in (None, 0):
+        parts.append(f"exit {span['exit_code']}")
+    if span.get("status") != "ok":
+        parts.append(span["status"])
+    if span.get("error"):
+        parts.append(str(span["error"]).splitlines()[0][:60])
+    return ", ".join(parts)
+
+
+def print_summary(events, min_seconds=0.05):
+    """Flame-style breakdown of where the time went"""
+    children = span_tree(events)
+    roots = children.get(None, [])
+    if not roots:
+        print("No spans recorded")
+        return
+    total = max(sum(span["seconds"] for span in roots), 1e-9)
+
+    print("\n🔥 Where the time went:")
+    name_width = 44
+
+    def show(span, depth):
+        if span["seconds"] < min_seconds and depth > 0:
+            return
+        share = span["seconds"] / total
+        bar = "█" * round(share * BAR_WIDTH)
+        label = ("  " * depth + span["name"])[:name_width]
+        line = f"  {label:<{name_width}}{span['seconds']:>9.1f}s {share:>6.1%}  {bar:<{BAR_WIDTH}} {describe(span)}"
+        print(line.rstrip())
+        for child in sorted(children.get(span["span"], []), key=lambda s: -s["seconds"]):
+            show(child, depth + 1)
+
+    for root in roots:
+        show(root, 0)
+
+    downloaded = sum(span.get("bytes") or 0 for spans in children.values() for span in spans
+                     if span["name"].startswith("download "))
+    failures = [span for spans in children.values() for span in spans if span["status"] != "ok"]
+    print(f"\n  total {total:.1f}s, downloaded {downloaded / 1e6:.1f} MB, "
+          f"{len(failures)} failed step(s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise an installer event log")
+    parser.add_argument("log", help="JSONL event log written by the installer")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="Hide nested steps shorter than this")
+    args = parser.parse_args()
+    try:
+        events = load_events(args.log)
+    except OSError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print_summary(events, args.min_seconds)
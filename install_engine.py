@@ -0,0 +1,971 @@
+"""
+Parallel install engine for the VapourSynth installer
+Resolves the whole pinned set once, downloads every wheel at the same
+time and installs them all in a single pip transaction
+"""
+
+import argparse
+import hashlib
+import importlib.metadata
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import sysconfig
+import tempfile
+import threading
+import time
+import http.client
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from pathlib import Path
+
+from event_log import EventLog
+
+PYPI_INDEX_URL = "https://pypi.org/simple"
+TORCH_INDEX_URL = "https://download.pytorch.org/whl/cu118"
+CHUNK_SIZE = 1024 * 1024
+# Wheels at least this big are fetched as several ranged requests at once
+PARALLEL_THRESHOLD = 64 * 1024 ** 2
+DOWNLOAD_SEGMENTS = 4
+DOWNLOAD_RETRIES = 5
+DOWNLOAD_TIMEOUT = 60
+DEFAULT_CACHE_DIR = Path.home() / "VapourSynth_WheelCache"
+DEFAULT_CACHE_LIMIT = 10 * 1024 ** 3
+
+# Why a source package may fail to build, shown with the pip error
+SDIST_HINTS = {
+    "vapoursynth": ("\nPyPI has no VapourSynth wheels for this platform, so pip builds it "
+                    "against the system VapourSynth library. Install VapourSynth from your "
+                    "distribution (or build it from source) first, then run the installer again."),
+}
+
+# Never removed when reconciling an environment
+PROTECTED_PACKAGES = {"pip", "setuptools", "wheel"}
+
+LOCK_FILE = Path(__file__).with_name("packages.lock.json")
+
+# Install profile used when nothing else is chosen (the lock's "profiles")
+DEFAULT_PROFILE = "cuda"
+# GPU-less machines with less free disk than this get no torch at all
+TORCH_MIN_FREE_BYTES = 5 * 1024 ** 3
+
+# pip --platform tags to resolve each lock platform against
+LOCK_PLATFORMS = {
+    "win_amd64": ["win_amd64"],
+    "linux_x86_64": ["manylinux_2_28_x86_64", "manylinux_2_17_x86_64",
+                     "manylinux2014_x86_64", "linux_x86_64"],
+}
+
+
+class InstallError(Exception):
+    """Raised when a stage of the install engine fails"""
+
+
+def canonical_name(name):
+    """Normalise a distribution name the way pip compares them"""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def read_installed(site_packages):
+    """Map installed distributions to versions from dist-info metadata only
+
+    Nothing in the environment is imported, so a broken numpy or
+    vapoursynth cannot take the installer down with it.
+    """
+    installed = {}
+    for dist in importlib.metadata.distributions(path=[str(site_packages)]):
+        name = dist.metadata["Name"]
+        if name:
+            installed[canonical_name(name)] = dist.version
+    return installed
+
+
+def plan_reconcile(installed, artifacts):
+    """Work out which packages differ between an environment and a resolved set"""
+    wanted = {canonical_name(a["name"]): a for a in artifacts}
+    plan = {"install": [], "repin": [], "remove": [], "unchanged": []}
+    for name, artifact in wanted.items():
+        current = installed.get(name)
+        if current is None:
+            plan["install"].append(artifact)
+        elif current != artifact["version"]:
+            plan["repin"].append(dict(artifact, installed=current))
+        else:
+            plan["unchanged"].append(name)
+    for name in installed:
+        if name not in wanted and name not in PROTECTED_PACKAGES:
+            plan["remove"].append(name)
+    return plan
+
+
+def write_json_atomic(path, data):
+    """Write JSON so concurrent readers (other installer processes) never see a partial file"""
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    tmp.replace(path)
+
+
+def load_lock(path=LOCK_FILE):
+    """Read the lock file shared by the real and TEST installers"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def lock_profile(lock, profile=DEFAULT_PROFILE):
+    """Settings of one install profile in the lock"""
+    profiles = lock.get("profiles", {DEFAULT_PROFILE: {}})
+    if profile not in profiles:
+        raise InstallError(f"Unknown install profile {profile!r} (lock has: {', '.join(profiles)})")
+    return profiles[profile]
+
+
+def lock_packages(lock, profile=DEFAULT_PROFILE):
+    """Pinned packages of a lock with a profile's exclusions and version overrides applied"""
+    settings = lock_profile(lock, profile)
+    packages = []
+    for package in lock["packages"]:
+        if package["name"] in settings.get("exclude", []):
+            continue
+        version = settings.get("versions", {}).get(package["name"], package["version"])
+        note = settings.get("notes", {}).get(package["name"], package["note"])
+        packages.append(dict(package, version=version, note=note))
+    return packages
+
+
+def lock_requirements(lock, profile=DEFAULT_PROFILE):
+    """Requirement strings for the pinned packages in a lock"""
+    requirements = []
+    for package in lock_packages(lock, profile):
+        requirements.append(f"{package['name']}=={package['version']}")
+        requirements += package.get("with", [])
+    return requirements
+
+
+def profile_index(lock, profile=DEFAULT_PROFILE):
+    """Extra index the profile's torch build comes from, or None for profiles without torch"""
+    settings = lock_profile(lock, profile)
+    if "torch" in settings.get("exclude", []):
+        return None
+    return settings.get("torch_index", TORCH_INDEX_URL)
+
+
+def choose_profile(lock, gpu, install_dir, requested=None):
+    """(profile, reason): the requested profile, else one picked from the GPU and free disk"""
+    if requested:
+        return requested, "requested"
+    if gpu:
+        return "cuda", "NVIDIA GPU detected"
+    profiles = lock.get("profiles", {})
+    free = shutil.disk_usage(install_dir).free
+    if free < TORCH_MIN_FREE_BYTES and "no-torch" in profiles:
+        return "no-torch", f"no NVIDIA GPU and only {free / 1e9:.1f} GB free"
+    if "cpu" in profiles:
+        return "cpu", "no NVIDIA GPU detected"
+    return DEFAULT_PROFILE, "no NVIDIA GPU, but the lock has no cpu profile"
+
+
+def platform_key(python_version=None, profile=DEFAULT_PROFILE):
+    """Lock key for a platform, Python and profile, e.g. win_amd64-cp312 or win_amd64-cp312-cpu"""
+    if python_version is None:
+        python_version = f"{sys.version_info.major}.{sys.version_info.minor}"
+    plat = sysconfig.get_platform().replace("-", "_").replace(".", "_")
+    return lock_key(plat, python_version, profile)
+
+
+def lock_key(plat, python_version, profile=DEFAULT_PROFILE):
+    key = f"{plat}-cp{python_version.replace('.', '')}"
+    return key if profile == DEFAULT_PROFILE else f"{key}-{profile}"
+
+
+def locked_artifacts(lock, key=None, profile=DEFAULT_PROFILE):
+    """Exact wheels locked for a platform, or None if it was never locked"""
+    entries = lock.get("platforms", {}).get(key or platform_key(profile=profile))
+    return [dict(entry) for entry in entries] if entries else None
+
+
+def download_footprint(artifacts):
+    """Total wheel bytes of a locked set, or None if a size is unknown"""
+    if not artifacts or any(a.get("size") is None for a in artifacts):
+        return None
+    return sum(a["size"] for a in artifacts)
+
+
+def directory_size(path):
+    """Bytes used on disk under path, counting hardlinked files once"""
+    seen = set()
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            if (st.st_dev, st.st_ino) in seen:
+                continue
+            seen.add((st.st_dev, st.st_ino))
+            total += st.st_size
+    return total
+
+
+def generate_lock(platforms, python_versions, profiles=None, path=LOCK_FILE):
+    """Resolve the pinned packages for each platform and profile, recording every wheel's URL, hash and size"""
+    lock = load_lock(path)
+    profiles = profiles or list(lock.get("profiles", [DEFAULT_PROFILE]))
+    extra = {profile_index(lock, p) for p in profiles} - {None}
+    lock["index_urls"] = [PYPI_INDEX_URL] + sorted(extra)
+    lock.setdefault("platforms", {})
+    locked = 0
+    for profile in profiles:
+        requirements = lock_requirements(lock, profile)
+        engine = InstallEngine([sys.executable, "-m", "pip"], torch_index=profile_index(lock, profile))
+        for plat in platforms:
+            for python_version in python_versions:
+                key = lock_key(plat, python_version, profile)
+                try:
+                    with tempfile.TemporaryDirectory(prefix="vs_lock_") as work_dir:
+                        artifacts = engine.resolve(requirements, work_dir, plat, python_version)
+                except InstallError as e:
+                    # No wheels for this combination: installs there resolve against the index
+                    errors = [line for line in str(e).splitlines() if line.startswith("ERROR:")]
+                    print(f"⚠️  {key}: not locked - {(errors or [str(e)])[0]}")
+                    continue
+                for artifact in artifacts:
+                    artifact["size"] = probe(artifact["url"])[0]
+                lock["platforms"][key] = sorted(artifacts, key=lambda a: canonical_name(a["name"]))
+                locked += 1
+                footprint = download_footprint(artifacts)
+                size = f", {footprint / 1e9:.2f} GB" if footprint is not None else ""
+                print(f"🔒 {key}: {len(artifacts)} wheels{size}")
+    if not locked:
+        raise InstallError("Nothing could be locked for the requested platforms")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(lock, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    return lock
+
+
+def cache_limit(text):
+    """argparse type: a cache size in GB, returned in bytes"""
+    try:
+        gb = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a size in GB: {text!r}")
+    if gb <= 0:
+        raise argparse.ArgumentTypeError("the cache limit must be more than 0 GB")
+    return int(gb * 1024 ** 3)
+
+
+class WheelCache:
+    """Content-addressed wheel store keyed by SHA-256 with LRU eviction
+
+    Wheels live at blobs/<sha256>/<filename> so pip can install them
+    directly. index.json records size and last use of every blob, and
+    manifests/ remembers the resolved set for each requirement list so
+    offline installs never need an index. Wheels built from a source
+    package record its hash as built_from, so the build happens once.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_LIMIT):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.blob_dir = self.root / "blobs"
+        self.manifest_dir = self.root / "manifests"
+        self.index_path = self.root / "index.json"
+        self.partial_dir = self.root / "partial"
+        self.lock = threading.Lock()
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_dir.mkdir(parents=True, exist_ok=True)
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        self.index = self.load_index()
+
+    def load_index(self):
+        """Read the index, dropping entries whose blob has gone missing"""
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        return {sha: entry for sha, entry in index.items()
+                if (self.blob_dir / sha / entry["filename"]).exists()}
+
+    def save(self):
+        """Write the index atomically"""
+        with self.lock:
+            write_json_atomic(self.index_path, self.index)
+
+    def get(self, sha256):
+        """Return the cached wheel path for a hash, or None"""
+        with self.lock:
+            entry = self.index.get(sha256)
+            if entry is None:
+                return None
+            entry["last_used"] = time.time()
+            return self.blob_dir / sha256 / entry["filename"]
+
+    def get_built(self, sdist_sha256):
+        """Return (sha256, path) of the wheel built from a source package, or None"""
+        with self.lock:
+            for sha256, entry in self.index.items():
+                if entry.get("built_from") == sdist_sha256:
+                    entry["last_used"] = time.time()
+                    return sha256, self.blob_dir / sha256 / entry["filename"]
+        return None
+
+    def put(self, path, sha256, built_from=None):
+        """Move a verified wheel into the store and return its new path"""
+        path = Path(path)
+        dest = self.blob_dir / sha256 / path.name
+        dest.parent.mkdir(exist_ok=True)
+        shutil.move(str(path), str(dest))
+        with self.lock:
+            self.index[sha256] = {
+                "filename": path.name,
+                "size": dest.stat().st_size,
+                "last_used": time.time(),
+            }
+            if built_from:
+                self.index[sha256]["built_from"] = built_from
+        return dest
+
+    def total_bytes(self):
+        """Size of every wheel in the store"""
+        return sum(entry["size"] for entry in self.index.values())
+
+    def evict(self):
+        """Drop least recently used wheels until the store fits its limit"""
+        removed = []
+        with self.lock:
+            total = sum(entry["size"] for entry in self.index.values())
+            by_age = sorted(self.index.items(), key=lambda item: item[1]["last_used"])
+            for sha256, entry in by_age:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(self.blob_dir / sha256, ignore_errors=True)
+                del self.index[sha256]
+                total -= entry["size"]
+                removed.append(entry["filename"])
+        self.save()
+        return removed
+
+    @staticmethod
+    def manifest_key(requirements):
+        """Stable key for a requirement list"""
+        text = "\n".join(sorted(requirements))
+        return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+    def save_manifest(self, requirements, artifacts):
+        """Remember the resolved set for a requirement list"""
+        path = self.manifest_dir / f"{self.manifest_key(requirements)}.json"
+        write_json_atomic(path, {"requirements": sorted(requirements), "artifacts": artifacts})
+
+    def load_manifest(self, requirements):
+        """Return the resolved set recorded for a requirement list, or None"""
+        path = self.manifest_dir / f"{self.manifest_key(requirements)}.json"
+        try:
+            with open(path) as f:
+                return json.load(f)["artifacts"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+class DownloadProgress:
+    """One live progress/throughput line shared by concurrent downloads
+
+    On a terminal the line is redrawn in place; in logs (fleet runs) a
+    plain line is printed every few seconds instead.
+    """
+
+    def __init__(self, stream=None, interval=None):
+        self.stream = stream or sys.stdout
+        self.tty = self.stream.isatty()
+        self.interval = interval or (0.5 if self.tty else 10)
+        self.files = {}
+        self.transferred = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.width = 0
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        with self.lock:
+            self.clear()
+
+    def add(self, name, total, done=0):
+        with self.lock:
+            self.files[name] = [done, total]
+
+    def advance(self, name, nbytes):
+        with self.lock:
+            self.files[name][0] += nbytes
+            self.transferred += nbytes
+
+    def finish(self, name):
+        with self.lock:
+            self.files.pop(name, None)
+
+    def write(self, line):
+        """Print a message without tearing the progress line"""
+        with self.lock:
+            self.clear()
+            print(line, file=self.stream, flush=True)
+
+    def clear(self):
+        if self.tty and self.width:
+            self.stream.write("\r" + " " * self.width + "\r")
+            self.width = 0
+
+    def loop(self):
+        last_time, last_bytes = time.perf_counter(), 0
+        while not self.stopped.wait(self.interval):
+            now = time.perf_counter()
+            with self.lock:
+                if not self.files:
+                    continue
+                rate = (self.transferred - last_bytes) / max(now - last_time, 1e-9)
+                last_time, last_bytes = now, self.transferred
+                done = sum(d for d, _ in self.files.values())
+                total = sum(t for _, t in self.files.values())
+                files = "  ".join(f"{name} {d / t:.0%}" if t else f"{name} {d / 1e6:.0f} MB"
+                                  for name, (d, t) in self.files.items())
+                line = (f"  ⬇️  {done / 1e6:.0f}/{total / 1e6:.0f} MB  "
+                        f"{rate / 1e6:.1f} MB/s  {files}")
+                if self.tty:
+                    self.clear()
+                    self.stream.write(line[:150])
+                    self.width = len(line[:150])
+                    self.stream.flush()
+                else:
+                    print(line, file=self.stream, flush=True)
+
+
+def is_sdist(filename):
+    """True for source packages, which pip has to build before installing"""
+    return not filename.endswith(".whl")
+
+
+def retryable(error):
+    """Network errors worth resuming after; client errors are final"""
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code >= 500 or error.code == 429
+    return isinstance(error, (OSError, http.client.HTTPException))
+
+
+def probe(url):
+    """(size, supports ranges) of a URL; (None, False) if the server will not say"""
+    request = urllib.request.Request(url, method="HEAD")
+    try:
+        with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response:
+            size = response.headers.get("Content-Length")
+            ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+            return (int(size) if size else None), ranges
+    except (OSError, http.client.HTTPException, ValueError):
+        return None, False
+
+
+def hash_file(path, digest, start, end):
+    """Feed bytes [start, end) of a file into a running digest"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return end
+
+
+class InstallEngine:
+    def __init__(self, pip_exe, max_workers=4, cache=None, offline=False, locked=None,
+                 events=None, torch_index=TORCH_INDEX_URL):
+        if isinstance(pip_exe, (list, tuple)):
+            self.pip_cmd = [str(part) for part in pip_exe]
+        else:
+            self.pip_cmd = [str(pip_exe)]
+        self.locked = locked
+        self.torch_index = torch_index
+        self.max_workers = max_workers
+        self.cache = cache
+        self.offline = offline
+        self.cache_hits = 0
+        self.stage_times = {}
+        self.bytes_downloaded = 0
+        self.wheel_bytes = 0
+        self.events = events if events is not None else EventLog()
+        self.progress = DownloadProgress(interval=float("inf"))
+
+    @contextmanager
+    def stage(self, name):
+        """Time one stage of the install"""
+        start = time.perf_counter()
+        try:
+            with self.events.span(name) as span:
+                yield span
+        finally:
+            self.stage_times[name] = time.perf_counter() - start
+
+    def pip(self, *args):
+        """Run pip from the target environment"""
+        with self.events.span(f"pip {args[0]}", args=list(args)) as span:
+            result = subprocess.run([*self.pip_cmd, *args],
+                                    capture_output=True, text=True)
+            span["exit_code"] = result.returncode
+        return result
+
+    def resolve(self, requirements, work_dir, platform=None, python_version=None):
+        """Resolve the full dependency set without downloading anything
+
+        With platform/python_version the set is resolved for another
+        machine (wheels only), which is how the lock file is built.
+        """
+        report_path = Path(work_dir) / "resolve.json"
+        target = []
+        if platform is not None:
+            target = ["--only-binary=:all:", "--implementation", "cp",
+                      "--target", str(Path(work_dir) / "target")]
+            for tag in LOCK_PLATFORMS.get(platform, [platform]):
+                target += ["--platform", tag]
+        if python_version is not None:
+            target += ["--python-version", python_version]
+        if self.torch_index is not None:
+            target += ["--extra-index-url", self.torch_index]
+        result = self.pip(
+            "install", "--dry-run", "--ignore-installed", "--quiet",
+            "--report", str(report_path),
+            "--index-url", PYPI_INDEX_URL,
+            *target,
+            *requirements
+        )
+        if result.returncode != 0:
+            raise InstallError(f"Dependency resolution failed: {result.stderr}")
+
+        with open(report_path) as f:
+            report = json.load(f)
+
+        artifacts = []
+        for item in report.get("install", []):
+            info = item["download_info"]
+            url = info["url"]
+            hashes = info.get("archive_info", {}).get("hashes", {})
+            artifacts.append({
+                "name": item["metadata"]["name"],
+                "version": item["metadata"]["version"],
+                "url": url,
+                "filename": urllib.parse.unquote(url.rsplit("/", 1)[-1].split("#")[0]),
+                "sha256": hashes.get("sha256"),
+            })
+        return artifacts
+
+    def fetch(self, artifact, dest_dir, parent=None):
+        """Download one wheel, verifying its hash while streaming"""
+        with self.events.span(f"download {artifact['name']}", parent=parent,
+                              package=artifact["name"], version=artifact["version"]) as span:
+            dest, received = self.fetch_wheel(artifact, dest_dir)
+            span["bytes"] = received
+        return dest, received
+
+    def fetch_wheel(self, artifact, dest_dir):
+        """Download one wheel, resuming a .part file left by an earlier attempt
+
+        Partial files live in the wheel cache so they survive a dropped
+        connection or a killed installer. Big wheels on servers that
+        support ranges are split into parallel segments. Returns the
+        wheel's path and the bytes received in this run.
+        """
+        dest = Path(dest_dir) / artifact["filename"]
+        partial_dir = self.cache.partial_dir if self.cache is not None else Path(dest_dir)
+        partial = partial_dir / (artifact["filename"] + ".part")
+        name = artifact["name"]
+
+        state_path = partial.with_name(partial.name + ".json")
+
+        total, ranges = probe(artifact["url"])
+        if ranges and total and total >= PARALLEL_THRESHOLD:
+            digest, received = self.fetch_segments(artifact["url"], partial, total, name)
+        else:
+            if state_path.exists():
+                # A segmented .part file has holes and cannot be streamed onto
+                partial.unlink(missing_ok=True)
+                state_path.unlink()
+            digest, received = self.fetch_stream(artifact["url"], partial, name)
+        self.progress.finish(name)
+
+        if artifact["sha256"] and digest.hexdigest() != artifact["sha256"]:
+            partial.unlink()
+            raise InstallError(f"Hash mismatch for {artifact['filename']}")
+
+        shutil.move(str(partial), str(dest))
+        artifact["sha256"] = digest.hexdigest()
+        if self.cache is not None:
+            dest = self.cache.put(dest, artifact["sha256"])
+        return dest, received
+
+    def fetch_stream(self, url, partial, name):
+        """Single-connection download, resumed with a Range request after errors
+
+        Returns the digest and the bytes received in this run.
+        """
+        digest = hashlib.sha256()
+        received = 0
+        done = hash_file(partial, digest, 0, partial.stat().st_size) if partial.exists() else 0
+        if done:
+            self.progress.write(f"  ⏯️  {name}: resuming at {done / 1e6:.1f} MB")
+
+        for attempt in range(DOWNLOAD_RETRIES + 1):
+            headers = {"Range": f"bytes={done}-"} if done else {}
+            request = urllib.request.Request(url, headers=headers)
+            try:
+                with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response:
+                    if done and response.status != 206:
+                        # Server ignored the range, start over
+                        digest, done = hashlib.sha256(), 0
+                    length = int(response.headers.get("Content-Length") or 0)
+                    expected = done + length
+                    self.progress.add(name, expected if length else 0, done)
+                    with open(partial, "ab" if done else "wb") as f:
+                        while True:
+                            chunk = response.read(CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            f.write(chunk)
+                            digest.update(chunk)
+                            done += len(chunk)
+                            received += len(chunk)
+                            self.progress.advance(name, len(chunk))
+                    if length and done < expected:
+                        raise http.client.IncompleteRead(b"", expected - done)
+                return digest, received
+            except urllib.error.HTTPError as e:
+                if e.code == 416 and done:
+                    return digest, received  # the .part file was already complete
+                if not retryable(e) or attempt == DOWNLOAD_RETRIES:
+                    raise
+                error = e
+            except Exception as e:
+                if not retryable(e) or attempt == DOWNLOAD_RETRIES:
+                    raise
+                error = e
+            self.progress.write(f"  🔁 {name}: {str(error) or type(error).__name__}, "
+                                f"resuming at {done / 1e6:.1f} MB")
+            time.sleep(min(2 ** attempt, 30))
+
+    def fetch_segments(self, url, partial, total, name):
+        """Download one big file as parallel ranged segments
+
+        Segment progress is checkpointed next to the .part file so an
+        interrupted download resumes where each segment stopped. The
+        hash follows the contiguous finished prefix of the file, so the
+        check is done by the time the last segment lands. Returns the
+        digest and the bytes received in this run.
+        """
+        state_path = partial.with_name(partial.name + ".json")
+        segments = None
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+            if state["url"] == url and state["size"] == total and partial.exists():
+                segments = state["segments"]
+        except (OSError, ValueError, KeyError):
+            pass
+        if segments is None:
+            step = -(-total // DOWNLOAD_SEGMENTS)
+            segments = [{"start": start, "end": min(start + step, total), "pos": start}
+                        for start in range(0, total, step)]
+            with open(partial, "wb") as f:
+                f.truncate(total)
+        resumed = sum(seg["pos"] - seg["start"] for seg in segments)
+        if resumed:
+            self.progress.write(f"  ⏯️  {name}: resuming at {resumed / 1e6:.1f} MB")
+        self.progress.add(name, total, resumed)
+
+        def save_state():
+            write_json_atomic(state_path, {"url": url, "size": total, "segments": segments})
+
+        def fetch_segment(seg):
+            for attempt in range(DOWNLOAD_RETRIES + 1):
+                if seg["pos"] >= seg["end"]:
+                    return
+                request = urllib.request.Request(
+                    url, headers={"Range": f"bytes={seg['pos']}-{seg['end'] - 1}"})
+                try:
+                    with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response:
+                        if response.status != 206:
+                            raise InstallError(f"{url} ignored the Range header")
+                        with open(partial, "r+b") as f:
+                            f.seek(seg["pos"])
+                            while seg["pos"] < seg["end"]:
+                                chunk = response.read(min(CHUNK_SIZE, seg["end"] - seg["pos"]))
+                                if not chunk:
+                                    break
+                                f.write(chunk)
+                                # The hasher reads pos bytes back from disk
+                                f.flush()
+                                seg["pos"] += len(chunk)
+                                self.progress.advance(name, len(chunk))
+                    if seg["pos"] < seg["end"]:
+                        raise http.client.IncompleteRead(b"", seg["end"] - seg["pos"])
+                except InstallError:
+                    raise
+                except Exception as e:
+                    if not retryable(e) or attempt == DOWNLOAD_RETRIES:
+                        raise
+                    self.progress.write(f"  🔁 {name}: {str(e) or type(e).__name__}, "
+                                        f"resuming segment at {seg['pos'] / 1e6:.1f} MB")
+                    time.sleep(min(2 ** attempt, 30))
+
+        digest = hashlib.sha256()
+        hashed = 0
+        with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+            futures = [pool.submit(fetch_segment, seg) for seg in segments]
+            while not all(future.done() for future in futures):
+                wait(futures, timeout=1)
+                contiguous = next((seg["pos"] for seg in segments if seg["pos"] < seg["end"]), total)
+                hashed = hash_file(partial, digest, hashed, contiguous)
+                save_state()
+            try:
+                for future in futures:
+                    future.result()
+            finally:
+                save_state()
+
+        hash_file(partial, digest, hashed, total)
+        state_path.unlink()
+        return digest, total - resumed
+
+    def download(self, artifacts, dest_dir):
+        """Download all artifacts concurrently, returning (artifact, path) pairs
+
+        Source packages are built into wheels here, so the pairs only
+        ever hold wheels that install with --no-index.
+        """
+        downloaded = []
+        missing = []
+        for artifact in artifacts:
+            built = self.cached_build(artifact)
+            if built is not None:
+                self.cache_hits += 1
+                downloaded.append(built)
+                print(f"  📦 {artifact['name']} {artifact['version']} (built wheel cached)")
+                continue
+            cached = self.cache.get(artifact["sha256"]) if self.cache and artifact["sha256"] else None
+            if cached is not None:
+                self.cache_hits += 1
+                self.events.emit("cache_hit", package=artifact["name"], version=artifact["version"])
+                downloaded.append((artifact, cached))
+                print(f"  📦 {artifact['name']} {artifact['version']} (cached)")
+            else:
+                missing.append(artifact)
+
+        if missing and self.offline:
+            names = ", ".join(a["filename"] for a in missing)
+            raise InstallError(f"Offline mode: not in wheel cache: {names}")
+
+        parent = self.events.current()
+        with DownloadProgress() as self.progress, \
+                ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.fetch, a, dest_dir, parent): a for a in missing}
+            for future in as_completed(futures):
+                artifact = futures[future]
+                try:
+                    path, received = future.result()
+                except InstallError:
+                    raise
+                except Exception as e:
+                    raise InstallError(f"Download of {artifact['filename']} failed: {e}")
+                self.bytes_downloaded += received
+                downloaded.append((artifact, path))
+                size = Path(path).stat().st_size
+                resumed = f", {(size - received) / 1e6:.1f} MB resumed" if received < size else ""
+                self.progress.write(f"  ⬇️  {artifact['name']} {artifact['version']} "
+                                    f"({size / 1e6:.1f} MB{resumed})")
+        downloaded = [self.build_wheel(artifact, path, dest_dir)
+                      if is_sdist(artifact["filename"]) else (artifact, path)
+                      for artifact, path in downloaded]
+        self.wheel_bytes += sum(Path(path).stat().st_size for _, path in downloaded)
+        return downloaded
+
+    def cached_build(self, artifact):
+        """(wheel artifact, path) for a source package built in an earlier run, or None"""
+        if self.cache is None or not artifact["sha256"] or not is_sdist(artifact["filename"]):
+            return None
+        built = self.cache.get_built(artifact["sha256"])
+        if built is None:
+            return None
+        sha256, path = built
+        return dict(artifact, filename=path.name, sha256=sha256), path
+
+    def build_wheel(self, artifact, sdist, dest_dir):
+        """Build a downloaded source package into a wheel and cache it by its own hash"""
+        if self.offline:
+            raise InstallError(f"Offline mode: {artifact['filename']} is a source package and no "
+                               f"wheel built from it is cached; prefetch it online on a machine "
+                               f"with the same platform and Python first")
+        print(f"  🔨 Building {artifact['name']} {artifact['version']} from source...")
+        wheel_dir = Path(tempfile.mkdtemp(prefix="build_", dir=dest_dir))
+        result = self.pip("wheel", "--no-deps", "--index-url", PYPI_INDEX_URL,
+                          "--wheel-dir", str(wheel_dir), str(sdist))
+        wheels = list(wheel_dir.glob("*.whl"))
+        if result.returncode != 0 or not wheels:
+            errors = [line for line in result.stderr.splitlines() if line.startswith("ERROR:")]
+            hint = SDIST_HINTS.get(canonical_name(artifact["name"]), "")
+            raise InstallError(f"Building {artifact['filename']} failed"
+                               f"{': ' + errors[0] if errors else ''}{hint}")
+
+        digest = hashlib.sha256()
+        hash_file(wheels[0], digest, 0, wheels[0].stat().st_size)
+        sha256 = digest.hexdigest()
+        path = wheels[0]
+        if self.cache is not None:
+            path = self.cache.put(path, sha256, built_from=artifact["sha256"])
+        return dict(artifact, filename=path.name, sha256=sha256), path
+
+    def install(self, downloaded, work_dir):
+        """Install every downloaded wheel in one hash-checked pip transaction"""
+        requirements_path = Path(work_dir) / "install-requirements.txt"
+        with open(requirements_path, "w") as f:
+            for artifact, path in downloaded:
+                f.write(f"{artifact['name']} @ {Path(path).resolve().as_uri()} "
+                        f"--hash=sha256:{artifact['sha256']}\n")
+        result = self.pip("install", "--no-index", "--no-deps", "--require-hashes",
+                          "-r", str(requirements_path))
+        if result.returncode != 0:
+            raise InstallError(f"Install failed: {result.stderr}")
+
+    def resolve_pinned(self, requirements, work_dir, prefer_manifest=False):
+        """Resolve the requirements from the lock, the cached manifest or the index"""
+        if self.locked is not None:
+            print(f"  🔒 Using lock file ({len(self.locked)} packages, no resolver)")
+            return self.locked
+        artifacts = None
+        if self.cache is not None and (self.offline or prefer_manifest):
+            artifacts = self.cache.load_manifest(requirements)
+        if artifacts is None:
+            if self.offline:
+                raise InstallError("Offline mode: no cached resolution for these packages")
+            artifacts = self.resolve(requirements, work_dir)
+        print(f"  🔗 Resolved {len(artifacts)} packages")
+        return artifacts
+
+    def prefetch(self, requirements):
+        """Resolve and download into the cache without installing anything"""
+        if self.cache is None:
+            raise InstallError("Prefetching needs a wheel cache")
+        with tempfile.TemporaryDirectory(prefix="vs_wheels_") as work_dir:
+            with self.stage("resolve"):
+                artifacts = self.resolve_pinned(requirements, work_dir)
+            with self.stage("download"):
+                self.download(artifacts, work_dir)
+                self.cache.save_manifest(requirements, artifacts)
+                self.cache.save()
+        return artifacts
+
+    def run(self, requirements):
+        """Resolve, download and install the requirements, returning the resolved set"""
+        with tempfile.TemporaryDirectory(prefix="vs_wheels_") as work_dir:
+            with self.stage("resolve"):
+                artifacts = self.resolve_pinned(requirements, work_dir)
+
+            with self.stage("download"):
+                downloaded = self.download(artifacts, work_dir)
+                if self.cache is not None:
+                    self.cache.save_manifest(requirements, artifacts)
+                    self.cache.save()
+
+            with self.stage("install"):
+                self.install(downloaded, work_dir)
+
+        if self.cache is not None:
+            for filename in self.cache.evict():
+                print(f"  🗑️  Evicted {filename} from wheel cache")
+        return artifacts
+
+    def reconcile(self, requirements, site_packages):
+        """Bring an existing environment in line with the pinned set
+
+        Only packages that are missing, at the wrong version or not part
+        of the pinned set are touched; everything else stays in place.
+        """
+        with tempfile.TemporaryDirectory(prefix="vs_wheels_") as work_dir:
+            with self.stage("resolve"):
+                artifacts = self.resolve_pinned(requirements, work_dir, prefer_manifest=True)
+                plan = plan_reconcile(read_installed(site_packages), artifacts)
+
+            for artifact in plan["repin"]:
+                print(f"  🔁 {artifact['name']} {artifact['installed']} -> {artifact['version']}")
+            for artifact in plan["install"]:
+                print(f"  ➕ {artifact['name']} {artifact['version']}")
+            for name in plan["remove"]:
+                print(f"  ➖ {name}")
+            print(f"  ✔️  {len(plan['unchanged'])} packages already correct")
+
+            changed = plan["install"] + plan["repin"]
+            with self.stage("download"):
+                downloaded = self.download(changed, work_dir)
+                if self.cache is not None:
+                    self.cache.save_manifest(requirements, artifacts)
+                    self.cache.save()
+
+            with self.stage("install"):
+                if plan["remove"]:
+                    result = self.pip("uninstall", "-y", *plan["remove"])
+                    if result.returncode != 0:
+                        raise InstallError(f"Uninstall failed: {result.stderr}")
+                if downloaded:
+                    self.install(downloaded, work_dir)
+
+        if self.cache is not None:
+            self.cache.evict()
+        return plan
+
+    def print_timings(self):
+        """Print the time spent in each stage"""
+        print("\n⏱️  Install stage timings:")
+        for name, seconds in self.stage_times.items():
+            print(f"  {name:<10} {seconds:8.1f}s")
+        if self.cache is not None:
+            print(f"  cache hits {self.cache_hits}, cache size {self.cache.total_bytes() / 1e9:.2f} GB")
+        if self.bytes_downloaded:
+            rate = self.bytes_downloaded / max(self.stage_times.get("download", 0), 1e-9)
+            print(f"  downloaded {self.bytes_downloaded / 1e6:.1f} MB at {rate / 1e6:.1f} MB/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regenerate packages.lock.json or trim the wheel cache")
+    parser.add_argument("command", choices=["lock", "prune"])
+    parser.add_argument("--platform", nargs="+", default=list(LOCK_PLATFORMS),
+                        help="Platforms to lock (default: all)")
+    parser.add_argument("--python", nargs="+", default=["3.10", "3.11", "3.12"],
+                        help="Python versions to lock")
+    parser.add_argument("--profile", nargs="+",
+                        help="Install profiles to lock (default: every profile in the lock)")
+    parser.add_argument("--cache", type=Path, default=DEFAULT_CACHE_DIR,
+                        help=f"Wheel cache to prune (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-limit", type=cache_limit, default=DEFAULT_CACHE_LIMIT, metavar="GB",
+                        help=f"Size the cache is pruned to (default: {DEFAULT_CACHE_LIMIT // 1024 ** 3})")
+    args = parser.parse_args()
+
+    if args.command == "prune":
+        cache = WheelCache(args.cache, max_bytes=args.cache_limit)
+        removed = cache.evict()
+        print(f"🧹 Removed {len(removed)} wheels, {cache.total_bytes() / 1e9:.2f} GB left in {args.cache}")
+        sys.exit(0)
+    try:
+        generate_lock(args.platform, args.python, args.profile)
+    except InstallError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
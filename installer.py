@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+VapourSynth fleet provisioning
+Provisions many environments at once from one shared wheel cache: every
+wheel is downloaded a single time up front, then each target is set up
+concurrently by its own non-interactive VapourSynth_Installer.py process.
+
+Targets are local directories, or user@host:/path over ssh. Remote hosts
+get the installer plus only the wheels they need, so they never touch
+the network; they must run the same platform and Python as this machine,
+which is checked before the bundle is pushed.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shlex
+import shutil
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+from install_engine import (InstallEngine, InstallError, WheelCache, DEFAULT_CACHE_DIR,
+                            DEFAULT_CACHE_LIMIT, DEFAULT_PROFILE, cache_limit, is_sdist, load_lock,
+                            lock_key, lock_requirements, locked_artifacts, platform_key,
+                            profile_index)
+
+HERE = Path(__file__).resolve().parent
+INSTALLER = HERE / "VapourSynth_Installer.py"
+# Printed by the remote python: what platform_key() is built from
+PLATFORM_PROBE = ("import sys, sysconfig; print(sysconfig.get_platform(), "
+                  "'%d.%d' % sys.version_info[:2])")
+BUNDLE_FILES = ["VapourSynth_Installer.py", "install_engine.py", "platform_backend.py",
+                "venv_template.py", "event_log.py", "packages.lock.json"]
+
+
+def parse_target(spec):
+    """Split a target into host (or None for local) and path"""
+    match = re.match(r"^([^/\\:]{2,}):(.+)$", spec)
+    if match:
+        return {"spec": spec, "host": match.group(1), "path": match.group(2)}
+    return {"spec": spec, "host": None, "path": str(Path(spec).expanduser().resolve())}
+
+
+def prefetch(wheelhouse, offline=False, profile=DEFAULT_PROFILE, max_bytes=DEFAULT_CACHE_LIMIT):
+    """Resolve once and download every wheel into the shared cache"""
+    lock = load_lock()
+    requirements = lock_requirements(lock, profile)
+    engine = InstallEngine([sys.executable, "-m", "pip"], cache=WheelCache(wheelhouse, max_bytes),
+                           offline=offline, locked=locked_artifacts(lock, profile=profile),
+                           torch_index=profile_index(lock, profile))
+    artifacts = engine.prefetch(requirements)
+    engine.print_timings()
+    return requirements, artifacts
+
+
+def export_bundle(wheelhouse, requirements, artifacts, dest):
+    """Copy the installer and just the needed wheels into a self-contained folder"""
+    dest = Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    for name in BUNDLE_FILES:
+        shutil.copy2(HERE / name, dest / name)
+
+    source = WheelCache(wheelhouse)
+    bundle = WheelCache(dest / "wheelhouse")
+    for artifact in artifacts:
+        # Source packages travel as the wheel built from them, so targets never build
+        built = source.get_built(artifact["sha256"]) if is_sdist(artifact["filename"]) else None
+        sha256, blob = built or (artifact["sha256"], source.get(artifact["sha256"]))
+        staged = dest / blob.name
+        try:
+            os.link(blob, staged)
+        except OSError:
+            shutil.copy2(blob, staged)
+        bundle.put(staged, sha256, built_from=artifact["sha256"] if built else None)
+    bundle.save_manifest(requirements, artifacts)
+    bundle.save()
+    return dest
+
+
+def installer_args(install_dir, wheelhouse, report, recreate, launcher_dir=None, template=None,
+                   event_log=None, profile=DEFAULT_PROFILE, max_bytes=None):
+    """Command line for one unattended, offline installer run"""
+    args = ["-y", "--offline", "--wheelhouse", str(wheelhouse),
+            "--install-dir", str(install_dir), "--report", str(report),
+            "--profile", profile]
+    if event_log:
+        args += ["--event-log", str(event_log)]
+    if launcher_dir:
+        args += ["--launcher-dir", str(launcher_dir)]
+    if template:
+        args += ["--from-template", str(template)]
+    if recreate:
+        args.append("--recreate")
+    if max_bytes:
+        args += ["--cache-limit", str(max_bytes / 1024 ** 3)]
+    return args
+
+
+async def run_logged(cmd, log):
+    """Run a command with output appended to a log file, returning its exit code"""
+    with open(log, "ab") as f:
+        f.write(f"$ {' '.join(cmd)}\n".encode())
+        f.flush()
+        proc = await asyncio.create_subprocess_exec(*cmd, stdout=f, stderr=asyncio.subprocess.STDOUT)
+        return await proc.wait()
+
+
+async def provision_local(target, options, log):
+    """Install into a local directory straight from the shared cache"""
+    report = Path(log).with_suffix(".json")
+    cmd = [sys.executable, str(INSTALLER),
+           *installer_args(target["path"], options.wheelhouse, report,
+                           options.recreate, launcher_dir=target["path"],
+                           template=options.from_template,
+                           event_log=Path(log).with_suffix(".events.jsonl"),
+                           profile=options.profile, max_bytes=options.cache_limit)]
+    code = await run_logged(cmd, log)
+    try:
+        with open(report) as f:
+            return code, json.load(f)
+    except (OSError, ValueError):
+        return code, None
+
+
+async def remote_platform_key(host, python, log):
+    """platform_key() of a host's python, or None if it cannot be run"""
+    proc = await asyncio.create_subprocess_exec(
+        "ssh", host, f"{shlex.quote(python)} -c {shlex.quote(PLATFORM_PROBE)}",
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+    output, _ = await proc.communicate()
+    with open(log, "ab") as f:
+        f.write(f"$ ssh {host} {python} -c <platform probe>\n".encode() + output)
+    try:
+        plat, python_version = output.decode().split()[-2:]
+    except ValueError:
+        return None
+    if proc.returncode != 0:
+        return None
+    return lock_key(plat.replace("-", "_").replace(".", "_"), python_version)
+
+
+async def provision_remote(target, options, bundle, log, index=0):
+    """Push the bundle over ssh and install from it on the host
+
+    Each target gets its own copy of the bundle, so several targets on
+    one host never share a wheelhouse or a report file. Hosts whose
+    platform or Python differs from this machine fail before anything
+    is copied.
+    """
+    host = target["host"]
+    expected = platform_key()
+    actual = await remote_platform_key(host, options.remote_python, log)
+    if actual != expected:
+        found = f"is {actual}" if actual else f"could not run {options.remote_python}"
+        issue = (f"Failed: {host} {found}, but the bundle's wheels were built for {expected}; "
+                 f"use a matching --remote-python or provision it separately")
+        with open(log, "a") as f:
+            f.write(issue + "\n")
+        return 1, {"success": False, "issues_found": [issue]}
+
+    remote_dir = f"/tmp/{bundle.name}_{index:03d}"
+    remote_report = f"{remote_dir}/report.json"
+    remote_cmd = " ".join(shlex.quote(str(arg)) for arg in [
+        options.remote_python, f"{remote_dir}/VapourSynth_Installer.py",
+        *installer_args(target["path"], f"{remote_dir}/wheelhouse", remote_report,
+                        options.recreate, profile=options.profile)
+    ])
+
+    code = await run_logged(["scp", "-rq", str(bundle), f"{host}:{remote_dir}"], log)
+    if code == 0:
+        code = await run_logged(["ssh", host, remote_cmd], log)
+
+    proc = await asyncio.create_subprocess_exec(
+        "ssh", host, f"cat {shlex.quote(remote_report)}; rm -rf {shlex.quote(remote_dir)}",
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    output, _ = await proc.communicate()
+    try:
+        return code, json.loads(output)
+    except ValueError:
+        return code, None
+
+
+def classify(code, report):
+    """ok / warnings / failed for one target"""
+    if code != 0 or report is None or not report["success"]:
+        return "failed"
+    if any(issue.startswith("Failed") for issue in report["issues_found"]):
+        return "failed"
+    return "warnings" if report["issues_found"] else "ok"
+
+
+async def provision_all(targets, options, bundle):
+    """Provision every target, at most options.jobs at a time"""
+    semaphore = asyncio.Semaphore(options.jobs)
+    log_dir = Path(options.log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+
+    async def provision(index, target):
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", target["spec"]).strip("_")
+        log = log_dir / f"{index:03d}_{safe_name}.log"
+        async with semaphore:
+            print(f"▶️  {target['spec']}")
+            start = time.perf_counter()
+            if target["host"]:
+                code, report = await provision_remote(target, options, bundle, log, index)
+            else:
+                code, report = await provision_local(target, options, log)
+            seconds = time.perf_counter() - start
+        result = {
+            "target": target["spec"],
+            "status": classify(code, report),
+            "exit_code": code,
+            "seconds": round(seconds, 1),
+            "issues": report["issues_found"] if report else [],
+            "log": str(log),
+            "event_log": report.get("event_log") if report else None,
+            "profile": report.get("profile") if report else None,
+        }
+        icon = {"ok": "✅", "warnings": "⚠️ ", "failed": "❌"}[result["status"]]
+        print(f"{icon} {target['spec']} ({seconds:.1f}s)")
+        return result
+
+    return await asyncio.gather(*(provision(i, t) for i, t in enumerate(targets)))
+
+
+def print_summary(results, total_seconds):
+    print("\n" + "="*60)
+    print("PROVISIONING SUMMARY")
+    print("="*60)
+    width = max(len(r["target"]) for r in results)
+    for r in results:
+        issues = "; ".join(r["issues"]) or "-"
+        print(f"{r['target']:<{width}}  {r['status']:<9}{r['seconds']:>8.1f}s  {issues}")
+    counts = {status: sum(r["status"] == status for r in results)
+              for status in ("ok", "warnings", "failed")}
+    print(f"\n{len(results)} targets in {total_seconds:.1f}s: "
+          f"{counts['ok']} ok, {counts['warnings']} with warnings, {counts['failed']} failed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Provision many VapourSynth environments at once")
+    parser.add_argument("targets", nargs="*",
+                        help="Local directories or user@host:/path targets")
+    parser.add_argument("--targets-file", type=Path,
+                        help="File with one target per line (# comments allowed)")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 4,
+                        help="Targets provisioned at the same time")
+    parser.add_argument("--wheelhouse", type=Path, default=DEFAULT_CACHE_DIR,
+                        help=f"Shared wheel cache (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-limit", type=cache_limit, default=DEFAULT_CACHE_LIMIT, metavar="GB",
+                        help="Least recently used wheels are dropped above this size "
+                             f"(default: {DEFAULT_CACHE_LIMIT // 1024 ** 3})")
+    parser.add_argument("--offline", action="store_true",
+                        help="Do not download; the cache must already hold every wheel")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE,
+                        choices=list(load_lock().get("profiles", [DEFAULT_PROFILE])),
+                        help="Install profile for every target; targets cannot pick their "
+                             "own because wheels are prefetched once (default: %(default)s)")
+    parser.add_argument("--recreate", action="store_true",
+                        help="Rebuild existing environments instead of reconciling them")
+    parser.add_argument("--from-template", type=Path, metavar="DIR",
+                        help="Clone local targets from this verified template instead of installing")
+    parser.add_argument("--log-dir", default="provision_logs",
+                        help="Per-target installer logs (default: ./provision_logs)")
+    parser.add_argument("--remote-python", default="python3",
+                        help="Python used on ssh targets")
+    parser.add_argument("--summary-json", type=Path,
+                        help="Also write the per-target summary as JSON")
+    options = parser.parse_args(argv)
+
+    specs = list(options.targets)
+    if options.targets_file:
+        for line in options.targets_file.read_text().splitlines():
+            line = line.split("#", 1)[0].strip()
+            if line:
+                specs.append(line)
+    if not specs:
+        parser.error("no targets given")
+    targets = [parse_target(spec) for spec in specs]
+
+    start = time.perf_counter()
+    print(f"📥 Prefetching wheels into {options.wheelhouse}...")
+    try:
+        requirements, artifacts = prefetch(options.wheelhouse, options.offline, options.profile,
+                                           options.cache_limit)
+    except InstallError as e:
+        print(f"❌ {e}")
+        return 1
+
+    with tempfile.TemporaryDirectory(prefix="vs_provision_") as tmp:
+        bundle = None
+        if any(target["host"] for target in targets):
+            bundle = export_bundle(options.wheelhouse, requirements, artifacts,
+                                   Path(tmp) / f"vs_provision_{os.getpid()}")
+        print(f"\n🚀 Provisioning {len(targets)} targets, {options.jobs} at a time...")
+        results = asyncio.run(provision_all(targets, options, bundle))
+
+    print_summary(results, time.perf_counter() - start)
+    if options.summary_json:
+        with open(options.summary_json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(r["status"] != "failed" for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
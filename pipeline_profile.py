@@ -0,0 +1,282 @@
+"""
+VapourSynth pipeline profiler
+Renders part of a clip with VapourSynth's per-node timers switched on and
+reports, for every node of the graph, how much processing time it used,
+how fast it would run on its own and how many bytes it produces. The
+cost of turning output frames into NumPy arrays is measured separately,
+and the whole run can be saved as a Chrome trace (chrome://tracing or
+ui.perfetto.dev):
+
+    python pipeline_profile.py my_script.vpy --frames 200 --trace trace.json
+"""
+
+import sys
+import json
+import time
+import runpy
+import argparse
+import threading
+from collections import deque
+
+import numpy as np
+import vapoursynth as vs
+
+from universal_converter import plane_dtype, plane_shapes, allocate_batch
+
+core = vs.core
+
+SAMPLE_INTERVAL = 0.05
+SORT_KEYS = {
+    "time": lambda n: -n["seconds"],
+    "fps": lambda n: n["fps"] if n["fps"] is not None else float("inf"),
+    "bytes": lambda n: -(n["bytes"] or 0),
+    "name": lambda n: n["name"].lower(),
+    "graph": lambda n: n["id"],
+}
+
+
+def walk_graph(clip):
+    """Every node the clip depends on, output first, each listed once
+
+    Nodes can only be told apart when graph inspection is enabled, which
+    standalone Python does by default; inside vsscript hosts shared
+    nodes may show up more than once.
+    """
+    nodes, seen = [], set()
+    queue = deque([clip])
+    while queue:
+        node = queue.popleft()
+        if node in seen:
+            continue
+        seen.add(node)
+        nodes.append(node)
+        queue.extend(node.dependencies)
+    return nodes
+
+
+def frame_bytes(node):
+    """Bytes in one output frame of a node, or None for variable formats"""
+    try:
+        return sum(h * w for h, w in plane_shapes(node)) * plane_dtype(node.format).itemsize
+    except (ValueError, AttributeError):
+        return None
+
+
+def describe_node(node):
+    if node.format is None or not node.width:
+        return "variable"
+    return f"{node.width}x{node.height} {node.format.name}"
+
+
+class PipelineProfiler:
+    """Render a clip with node timing on and collect per-node and per-frame numbers"""
+
+    def __init__(self, clip, prefetch=None, interval=SAMPLE_INTERVAL):
+        self.clip = clip
+        self.prefetch = max(1, prefetch or core.num_threads)
+        self.interval = interval
+        self.nodes = walk_graph(clip)
+        self.inspectable = clip.is_inspectable(0)
+        self.samples = []
+        self.frames = []
+        self.conversions = []
+
+    def sample(self, stop):
+        """Read every node's timer each interval until stop is set"""
+        while not stop.wait(self.interval):
+            self.samples.append((time.perf_counter(), [node.timings for node in self.nodes]))
+
+    def render(self, count):
+        """Request frames in order with prefetch frames in flight, copying each into NumPy"""
+        ring = allocate_batch(self.clip, 2)
+        pending = deque()
+        next_request = 0
+
+        def request(n):
+            started = time.perf_counter()
+            future = self.clip.get_frame_async(n)
+            record = {"frame": n, "start": started, "end": None}
+            future.add_done_callback(lambda _: record.update(end=time.perf_counter()))
+            pending.append((future, record))
+
+        while next_request < count and len(pending) < self.prefetch:
+            request(next_request)
+            next_request += 1
+
+        slot = 0
+        while pending:
+            future, record = pending.popleft()
+            frame = future.result()
+            if next_request < count:
+                request(next_request)
+                next_request += 1
+
+            start = time.perf_counter()
+            for plane, buffer in enumerate(ring):
+                np.copyto(buffer[slot], np.asarray(frame[plane]))
+            end = time.perf_counter()
+            del frame
+            record["end"] = record["end"] or start
+            self.frames.append(record)
+            self.conversions.append({"frame": record["frame"], "start": start, "end": end})
+            slot ^= 1
+
+    def run(self, frames=None):
+        """Profile the first frames of the clip and return a JSON-ready report"""
+        count = min(frames or self.clip.num_frames, self.clip.num_frames)
+        core.timings.enabled = True
+        for node in self.nodes:
+            node.timings = 0
+
+        stop = threading.Event()
+        sampler = threading.Thread(target=self.sample, args=(stop,), daemon=True)
+        self.started = time.perf_counter()
+        self.samples.append((self.started, [0] * len(self.nodes)))
+        sampler.start()
+        try:
+            self.render(count)
+        finally:
+            stop.set()
+            sampler.join()
+            self.samples.append((time.perf_counter(), [node.timings for node in self.nodes]))
+        return self.report(count)
+
+    def report(self, count):
+        wall = self.samples[-1][0] - self.started
+        final = self.samples[-1][1]
+        total = sum(final) / 1e9
+        nodes = []
+        for index, (node, nanoseconds) in enumerate(zip(self.nodes, final)):
+            seconds = nanoseconds / 1e9
+            per_frame = frame_bytes(node)
+            nodes.append({
+                "id": index,
+                "name": node.node_name,
+                "mode": node.mode.name,
+                "format": describe_node(node),
+                "seconds": seconds,
+                "share": seconds / total if total else 0.0,
+                "fps": count / seconds if seconds else None,
+                "bytes": per_frame * count if per_frame is not None else None,
+            })
+        converted = sum(c["end"] - c["start"] for c in self.conversions)
+        output_bytes = frame_bytes(self.clip)
+        return {
+            "frames": count,
+            "wall_seconds": wall,
+            "fps": count / wall if wall else None,
+            "node_seconds": total,
+            "inspectable": self.inspectable,
+            "numpy": {
+                "seconds": converted,
+                "fps": count / converted if converted else None,
+                "bytes": output_bytes * count if output_bytes is not None else None,
+            },
+            "nodes": nodes,
+            "trace": self.trace_events(),
+        }
+
+    def trace_events(self):
+        """Chrome trace events: output frames, NumPy copies and per-node busy counters"""
+        def us(t):
+            return round((t - self.started) * 1e6, 1)
+
+        events = [
+            {"ph": "M", "pid": 1, "name": "process_name", "args": {"name": "VapourSynth pipeline"}},
+            {"ph": "M", "pid": 1, "tid": 1, "name": "thread_name", "args": {"name": "output frames"}},
+            {"ph": "M", "pid": 1, "tid": 2, "name": "thread_name", "args": {"name": "NumPy conversion"}},
+        ]
+        # Frames overlap while prefetch requests are in flight, so they are async slices
+        for record in self.frames:
+            span = {"pid": 1, "tid": 1, "cat": "frame", "id": record["frame"],
+                    "name": f"frame {record['frame']}"}
+            events.append({**span, "ph": "b", "ts": us(record["start"])})
+            events.append({**span, "ph": "e", "ts": us(record["end"])})
+        for record in self.conversions:
+            events.append({"ph": "X", "pid": 1, "tid": 2, "name": f"to NumPy {record['frame']}",
+                           "ts": us(record["start"]), "dur": us(record["end"]) - us(record["start"])})
+
+        # Counters: how many threads' worth of time each node used per sample interval
+        for (t0, before), (t1, after) in zip(self.samples, self.samples[1:]):
+            elapsed = max(t1 - t0, 1e-9)
+            for index, node in enumerate(self.nodes):
+                busy = (after[index] - before[index]) / 1e9 / elapsed
+                events.append({"ph": "C", "pid": 1, "name": f"#{index} {node.node_name}",
+                               "ts": us(t1), "args": {"threads busy": round(busy, 3)}})
+        return events
+
+
+def profile_clip(clip, frames=None, prefetch=None, interval=SAMPLE_INTERVAL):
+    """Profile the first frames of any clip; see PipelineProfiler"""
+    return PipelineProfiler(clip, prefetch, interval).run(frames)
+
+
+def print_table(report, sort="time"):
+    """Per-node table sorted by time, fps, bytes, name or graph order"""
+    print(f"\n🔍 {report['frames']} frames in {report['wall_seconds']:.2f}s "
+          f"({report['fps']:.1f} fps), {report['node_seconds']:.2f}s of node processing")
+    if not report["inspectable"]:
+        print("⚠️  Graph inspection is off (vsscript host): shared nodes may be counted twice")
+
+    header = f"  {'#':>3}  {'node':<24}{'mode':<17}{'format':<24}{'time':>9}{'share':>8}{'fps':>10}{'MB out':>10}"
+    print(header)
+    print("  " + "-" * (len(header) - 2))
+    for node in sorted(report["nodes"], key=SORT_KEYS[sort]):
+        fps = f"{node['fps']:.1f}" if node["fps"] is not None else "-"
+        size = f"{node['bytes'] / 1e6:.1f}" if node["bytes"] is not None else "-"
+        print(f"  {node['id']:>3}  {node['name'][:23]:<24}{node['mode'][:16]:<17}"
+              f"{node['format'][:23]:<24}{node['seconds']:>8.3f}s{node['share']:>8.1%}{fps:>10}{size:>10}")
+
+    numpy_cost = report["numpy"]
+    fps = f"{numpy_cost['fps']:.1f}" if numpy_cost["fps"] is not None else "-"
+    size = f"{numpy_cost['bytes'] / 1e6:.1f}" if numpy_cost["bytes"] is not None else "-"
+    print(f"  {'':>3}  {'(output -> NumPy copy)':<24}{'':<17}{'':<24}"
+          f"{numpy_cost['seconds']:>8.3f}s{'':>8}{fps:>10}{size:>10}")
+    print("\n  time = processing time inside the node, summed over threads; "
+          "fps = frames / that time.\n  ModifyFrame / FrameEval rows are Python callbacks, "
+          "i.e. the NumPy boundary inside the graph.")
+
+
+def write_trace(report, path):
+    """Save the run as Chrome trace JSON"""
+    with open(path, "w") as f:
+        json.dump({"traceEvents": report["trace"], "displayTimeUnit": "ms"}, f)
+
+
+def load_script_output(path, index=0):
+    """Run a .vpy/.py script and return the clip it set as output index"""
+    runpy.run_path(str(path), run_name="__vapoursynth__")
+    output = vs.get_outputs().get(index)
+    if output is None:
+        raise ValueError(f"{path} did not set output {index}")
+    return getattr(output, "clip", output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile every node of a VapourSynth script")
+    parser.add_argument("script", help=".vpy or .py script that calls set_output()")
+    parser.add_argument("--output", type=int, default=0, help="Output index to profile")
+    parser.add_argument("--frames", type=int, default=200, help="Frames to render (default: 200)")
+    parser.add_argument("--prefetch", type=int, default=None,
+                        help="Frames in flight (default: core.num_threads)")
+    parser.add_argument("--sort", choices=list(SORT_KEYS), default="time",
+                        help="Table order (default: time)")
+    parser.add_argument("--trace", help="Also write a Chrome trace JSON file")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        clip = load_script_output(args.script, args.output)
+    except (OSError, ValueError, vs.Error) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    report = profile_clip(clip, args.frames, args.prefetch)
+    if args.trace:
+        write_trace(report, args.trace)
+    if args.json:
+        print(json.dumps({k: v for k, v in report.items() if k != "trace"}, indent=2))
+    else:
+        print_table(report, args.sort)
+        if args.trace:
+            print(f"\n✅ Chrome trace: {args.trace}")
@@ -0,0 +1,261 @@
+"""
+Platform backends for the VapourSynth installer
+Everything that differs between Windows desktops and Linux render nodes:
+venv layout, where SVP4 and the player live, and what launcher to write.
+"""
+
+import platform
+import shutil
+import stat
+from pathlib import Path
+
+# Core thread/cache settings written by test_setup.py --tune, inside the venv
+TUNING_FILE_NAME = "vapoursynth_tuning.json"
+
+
+class PlatformBackend:
+    """Base backend; subclasses fill in the platform specifics"""
+
+    name = "unknown"
+    supported = False
+    player_name = "Player"
+    svp4_url = "https://www.svp-team.com/"
+    player_url = ""
+
+    def __init__(self, home=None):
+        self.home = Path(home) if home else Path.home()
+
+    def venv_paths(self, install_dir):
+        """python, pip and site-packages locations inside a venv"""
+        raise NotImplementedError
+
+    def svp4_candidates(self):
+        """Places SVPManager may be installed"""
+        return []
+
+    def player_candidates(self):
+        """Places the video player may be installed"""
+        return []
+
+    @staticmethod
+    def find_first(paths):
+        """First existing path, or None"""
+        for path in paths:
+            if path and Path(path).exists():
+                return Path(path)
+        return None
+
+    def find_svp4(self):
+        return self.find_first(self.svp4_candidates())
+
+    def find_player(self):
+        return self.find_first(self.player_candidates())
+
+    def write_launchers(self, install_dir, site_packages, svp4_path, player_path, dest_dir=None):
+        """Write the launcher file(s), into dest_dir if given, and return their paths"""
+        raise NotImplementedError
+
+    def next_steps(self, launchers):
+        """Lines shown at the end of a successful install"""
+        return [f"Run {launchers[0]}"] if launchers else []
+
+
+class WindowsBackend(PlatformBackend):
+    name = "Windows"
+    supported = True
+    player_name = "PotPlayer"
+    player_url = "https://potplayer.daum.net/"
+
+    def venv_paths(self, install_dir):
+        install_dir = Path(install_dir)
+        return {
+            "python": install_dir / "Scripts" / "python.exe",
+            "pip": install_dir / "Scripts" / "pip.exe",
+            "site_packages": install_dir / "Lib" / "site-packages",
+        }
+
+    def svp4_candidates(self):
+        return [
+            Path(r"C:\Program Files (x86)\SVP 4\SVPManager.exe"),
+            Path(r"C:\Program Files\SVP 4\SVPManager.exe")
+        ]
+
+    def player_candidates(self):
+        return [
+            Path(r"C:\Program Files\DAUM\PotPlayer\PotPlayerMini64.exe"),
+            Path(r"C:\Program Files (x86)\DAUM\PotPlayer\PotPlayerMini64.exe")
+        ]
+
+    def write_launchers(self, install_dir, site_packages, svp4_path, player_path, dest_dir=None):
+        launcher_dir = Path(dest_dir) if dest_dir else self.home / "Desktop"
+        launcher_path = launcher_dir / "Launch_VapourSynth_SVP4.bat"
+        launcher_path.parent.mkdir(parents=True, exist_ok=True)
+
+        launcher_content = f"""@echo off
+echo ============================================
+echo VapourSynth + SVP4 Launcher (Fixed Versions)
+echo ============================================
+echo.
+echo Using virtual environment with:
+echo - Python 3.12 compatible
+echo - NumPy 1.26.4 (NOT 2.0!)
+echo - VapourSynth R72
+echo - CUDA 11.8 support
+echo.
+
+rem Activate virtual environment
+call "{install_dir}\\Scripts\\activate.bat"
+
+rem Set environment variables
+set PYTHONPATH={site_packages}
+set VAPOURSYNTH_PATH={site_packages}
+set VS_TUNING_CONFIG={install_dir}\\{TUNING_FILE_NAME}
+
+rem set VS_PROFILE_STARTUP=1 to log per-module import times to stderr
+if defined VS_PROFILE_STARTUP set PYTHONPROFILEIMPORTTIME=1
+
+rem Start SVP4 if found
+if exist "{svp4_path}" (
+    echo Starting SVP4 Manager...
+    start "" "{svp4_path}"
+    timeout /t 5 /nobreak >nul
+)
+
+rem Start PotPlayer if found
+if exist "{player_path}" (
+    echo Starting PotPlayer...
+    start "" "{player_path}"
+    echo.
+    echo ✅ Remember: In PotPlayer press F5 → Video → VapourSynth → Enable
+)
+
+echo.
+echo ✅ Environment ready! Your setup uses the WORKING versions.
+echo.
+pause
+"""
+
+        with open(launcher_path, 'w') as f:
+            f.write(launcher_content)
+        return [launcher_path]
+
+    def next_steps(self, launchers):
+        return [
+            f"Run {launchers[0]}",
+            "In PotPlayer: F5 → Video → VapourSynth → Enable",
+            "Check SVP4 tray icon shows 'Active'",
+        ]
+
+
+class LinuxBackend(PlatformBackend):
+    name = "Linux"
+    supported = True
+    player_name = "mpv"
+    player_url = "https://mpv.io/"
+
+    def venv_paths(self, install_dir):
+        install_dir = Path(install_dir)
+        site_packages = next(install_dir.glob("lib/python*/site-packages"),
+                             install_dir / "lib" / "site-packages")
+        return {
+            "python": install_dir / "bin" / "python",
+            "pip": install_dir / "bin" / "pip",
+            "site_packages": site_packages,
+        }
+
+    def svp4_candidates(self):
+        return [
+            Path("/opt/svp/SVPManager"),
+            self.home / "SVP 4" / "SVPManager",
+            Path("/usr/bin/SVPManager"),
+        ]
+
+    def player_candidates(self):
+        found = shutil.which("mpv")
+        return [Path(found)] if found else [Path("/usr/bin/mpv")]
+
+    def write_launchers(self, install_dir, site_packages, svp4_path, player_path, dest_dir=None):
+        """Write a shell launcher and a systemd user unit for headless nodes"""
+        bin_dir = Path(dest_dir) if dest_dir else self.home / ".local" / "bin"
+        bin_dir.mkdir(parents=True, exist_ok=True)
+        launcher_path = bin_dir / "launch_vapoursynth_svp4.sh"
+
+        launcher_content = f"""#!/bin/sh
+# VapourSynth + SVP4 Launcher (Fixed Versions)
+#   launch_vapoursynth_svp4.sh                  start SVP4 and mpv (desktop)
+#   launch_vapoursynth_svp4.sh vspipe in.vpy -  run a command inside the environment
+
+. "{install_dir}/bin/activate"
+export PYTHONPATH="{site_packages}"
+export VS_TUNING_CONFIG="{install_dir}/{TUNING_FILE_NAME}"
+# VS_PROFILE_STARTUP=1 logs per-module import times to stderr
+[ -n "$VS_PROFILE_STARTUP" ] && export PYTHONPROFILEIMPORTTIME=1
+
+if [ "$#" -gt 0 ]; then
+    exec "$@"
+fi
+
+if [ -z "$DISPLAY$WAYLAND_DISPLAY" ]; then
+    echo "✅ Environment ready (headless). Pass a command to run it inside the environment."
+    exit 0
+fi
+
+if [ -x "{svp4_path}" ]; then
+    echo "Starting SVP4 Manager..."
+    "{svp4_path}" &
+    sleep 5
+fi
+
+if [ -x "{player_path}" ]; then
+    echo "Starting mpv..."
+    exec "{player_path}" --player-operation-mode=pseudo-gui
+fi
+
+echo "✅ Environment ready! Your setup uses the WORKING versions."
+"""
+        with open(launcher_path, 'w') as f:
+            f.write(launcher_content)
+        launcher_path.chmod(launcher_path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+        unit_dir = Path(dest_dir) if dest_dir else self.home / ".config" / "systemd" / "user"
+        unit_dir.mkdir(parents=True, exist_ok=True)
+        unit_path = unit_dir / "vapoursynth-svp4@.service"
+        unit_content = f"""[Unit]
+Description=VapourSynth render job %I
+
+[Service]
+Type=simple
+# %I is the .vpy script to render; output goes next to it as .y4m
+#   systemctl --user start "vapoursynth-svp4@$(systemd-escape --path /srv/jobs/a.vpy).service"
+ExecStart={launcher_path} vspipe -c y4m /%I /%I.y4m
+Restart=no
+
+[Install]
+WantedBy=default.target
+"""
+        with open(unit_path, 'w') as f:
+            f.write(unit_content)
+        return [launcher_path, unit_path]
+
+    def next_steps(self, launchers):
+        return [
+            f"Run {launchers[0]} (add a command to run it inside the environment)",
+            "Render headless: systemctl --user start "
+            "\"vapoursynth-svp4@$(systemd-escape --path /path/to/script.vpy).service\"",
+            "In mpv use --vf=vapoursynth=<script.vpy> for SVP-style interpolation",
+        ]
+
+
+BACKENDS = {
+    "Windows": WindowsBackend,
+    "Linux": LinuxBackend,
+}
+
+
+def get_backend(system=None, home=None):
+    """Backend for this (or the named) operating system"""
+    system = system or platform.system()
+    backend = BACKENDS.get(system, PlatformBackend)(home)
+    if backend.name == "unknown":
+        backend.name = system
+    return backend
@@ -0,0 +1,71 @@
+"""
+FrameCache slot leases: pinned slots are never reused, dropped leases unpin
+
+    python -m unittest discover tests
+"""
+
+import gc
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+try:
+    import vapoursynth as vs
+except ImportError:
+    raise unittest.SkipTest("VapourSynth is not installed")
+
+from universal_converter import FrameCache
+
+WIDTH, HEIGHT = 64, 48
+
+
+def numbered_clip(length=6):
+    """GRAY8 clip whose frame n is filled with the value n"""
+    frames = [vs.core.std.BlankClip(format=vs.GRAY8, width=WIDTH, height=HEIGHT,
+                                    length=1, color=n) for n in range(length)]
+    return vs.core.std.Splice(frames)
+
+
+class FrameCacheLeaseTest(unittest.TestCase):
+    def setUp(self):
+        self.clip = numbered_clip()
+        self.cache = FrameCache(max_bytes=2 * WIDTH * HEIGHT)
+
+    def test_pinned_slot_is_not_reused(self):
+        first = self.cache[self.clip, 1]
+        with self.cache[self.clip, 2]:
+            pass
+        third = self.cache[self.clip, 3]
+
+        self.assertEqual(first[0][0, 0], 1)
+        self.assertEqual(third[0][0, 0], 3)
+        self.assertIn((self.clip, 1), self.cache)
+        self.assertNotIn((self.clip, 2), self.cache)
+        first.release()
+        third.release()
+
+    def test_dropped_lease_unpins_its_slot(self):
+        self.cache[self.clip, 1]
+        self.cache[self.clip, 2]
+        gc.collect()
+        self.assertEqual(self.cache.stats()["pinned"], 0)
+
+        with self.cache[self.clip, 3] as planes:
+            self.assertEqual(planes[0][0, 0], 3)
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+        self.assertIn((self.clip, 3), self.cache)
+
+    def test_all_slots_pinned_returns_private_copy(self):
+        leases = [self.cache[self.clip, n] for n in (1, 2)]
+        with self.cache[self.clip, 4] as planes:
+            self.assertEqual(planes[0][0, 0], 4)
+        self.assertNotIn((self.clip, 4), self.cache)
+        for lease in leases:
+            lease.release()
+        self.assertEqual(self.cache.stats()["pinned"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+"""
+Resumable downloads against a local ranged HTTP server that drops connections
+
+    python -m unittest discover tests
+"""
+
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import install_engine
+from install_engine import InstallEngine, InstallError, WheelCache
+
+CHUNK = 16 * 1024
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Serves server.files, honouring Range, cutting the first server.drops bodies short"""
+
+    def log_message(self, *args):
+        pass
+
+    def respond(self, body):
+        server = self.server
+        data = server.files.get(self.path.lstrip("/"))
+        if data is None:
+            self.send_error(404)
+            return
+        start, end = 0, len(data) - 1
+        match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if match and server.ranges:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(data) - 1
+            if start >= len(data):
+                self.send_response(416)
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        else:
+            self.send_response(200)
+        if server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if not body:
+            return
+
+        with server.lock:
+            server.requests.append((start, end))
+            drop = server.drops > 0
+            server.drops -= drop
+        payload = data[start:end + 1]
+        if drop:
+            payload = payload[:server.drop_after]
+        for offset in range(0, len(payload), CHUNK):
+            self.wfile.write(payload[offset:offset + CHUNK])
+        if drop:
+            self.wfile.flush()
+            self.connection.shutdown(2)
+
+    def do_HEAD(self):
+        self.respond(False)
+
+    def do_GET(self):
+        self.respond(True)
+
+
+class ResumableDownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+        self.server.files = {}
+        self.server.requests = []
+        self.server.ranges = True
+        self.server.drops = 0
+        self.server.drop_after = 0
+        self.server.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        self.work = tempfile.TemporaryDirectory()
+        self.cache = WheelCache(Path(self.work.name) / "cache")
+        self.dest = Path(self.work.name) / "dest"
+        self.dest.mkdir()
+
+        # Small files, small segments and no back-off, so the test runs in seconds
+        for name, value in [("CHUNK_SIZE", CHUNK), ("PARALLEL_THRESHOLD", 256 * 1024),
+                            ("DOWNLOAD_SEGMENTS", 4), ("DOWNLOAD_TIMEOUT", 10)]:
+            patcher = mock.patch.object(install_engine, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(install_engine.time, "sleep")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.work.cleanup()
+
+    def publish(self, name, size, sha256=None):
+        data = os.urandom(size)
+        self.server.files[f"{name}.whl"] = data
+        artifact = {"name": name, "version": "1.0", "filename": f"{name}.whl",
+                    "url": f"http://127.0.0.1:{self.server.server_port}/{name}.whl",
+                    "sha256": sha256 or hashlib.sha256(data).hexdigest()}
+        return artifact, data
+
+    def download(self, artifact):
+        engine = InstallEngine([sys.executable, "-m", "pip"], cache=self.cache)
+        [(_, path)] = engine.download([dict(artifact)], self.dest)
+        return engine, Path(path)
+
+    def partial(self, artifact):
+        return self.cache.partial_dir / (artifact["filename"] + ".part")
+
+    def test_stream_resumes_after_dropped_connections(self):
+        artifact, data = self.publish("small", 200 * 1024)
+        self.server.drops, self.server.drop_after = 2, 50 * 1024
+
+        engine, path = self.download(artifact)
+
+        self.assertEqual(path.read_bytes(), data)
+        self.assertEqual([start for start, _ in self.server.requests], [0, 50 * 1024, 100 * 1024])
+        self.assertEqual(engine.bytes_downloaded, len(data))
+        self.assertFalse(self.partial(artifact).exists())
+
+    def test_stream_resume_counts_only_new_bytes(self):
+        artifact, data = self.publish("small", 200 * 1024)
+        self.partial(artifact).write_bytes(data[:120 * 1024])
+
+        engine, path = self.download(artifact)
+
+        self.assertEqual(path.read_bytes(), data)
+        self.assertEqual(self.server.requests, [(120 * 1024, len(data) - 1)])
+        self.assertEqual(engine.bytes_downloaded, len(data) - 120 * 1024)
+
+    def test_segments_retry_dropped_ranges(self):
+        artifact, data = self.publish("big", 1024 * 1024 + 123)
+        self.server.drops, self.server.drop_after = 3, 40 * 1024
+
+        engine, path = self.download(artifact)
+
+        self.assertEqual(path.read_bytes(), data)
+        starts = sorted({start for start, _ in self.server.requests})
+        self.assertGreaterEqual(len(starts), install_engine.DOWNLOAD_SEGMENTS + 3)
+        self.assertEqual(engine.bytes_downloaded, len(data))
+        self.assertFalse(self.partial(artifact).with_name("big.whl.part.json").exists())
+
+    def test_segments_resume_from_checkpoint(self):
+        artifact, data = self.publish("big", 1024 * 1024)
+        self.server.drops, self.server.drop_after = 4, 100 * 1024
+        with mock.patch.object(install_engine, "DOWNLOAD_RETRIES", 0):
+            with self.assertRaises(InstallError):
+                self.download(artifact)
+        state = self.partial(artifact).with_name("big.whl.part.json")
+        self.assertTrue(state.exists())
+
+        self.server.requests.clear()
+        engine, path = self.download(artifact)
+
+        self.assertEqual(path.read_bytes(), data)
+        self.assertTrue(all(start % (256 * 1024) == 100 * 1024 for start, _ in self.server.requests))
+        self.assertEqual(engine.bytes_downloaded, len(data) - 4 * 100 * 1024)
+        self.assertFalse(state.exists())
+
+    def test_hash_mismatch_discards_partial(self):
+        for name, size in [("small", 200 * 1024), ("big", 1024 * 1024)]:
+            with self.subTest(name):
+                artifact, _ = self.publish(name, size, sha256="0" * 64)
+                with self.assertRaisesRegex(InstallError, "Hash mismatch"):
+                    self.download(artifact)
+                self.assertFalse(self.partial(artifact).exists())
+                self.assertFalse((self.dest / artifact["filename"]).exists())
+                self.assertIsNone(self.cache.get("0" * 64))
+
+
+if __name__ == "__main__":
+    unittest.main()
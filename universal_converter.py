@@ -0,0 +1,1125 @@
+"""
+VapourSynth <-> NumPy bridge
+Wraps frame plane buffers as ndarrays through the buffer protocol, so
+reading a frame never copies pixels and writing one copies each plane
+exactly once into VapourSynth-owned memory.
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import argparse
+import threading
+import weakref
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import vapoursynth as vs
+
+core = vs.core
+
+
+def plane_dtype(fmt):
+    """NumPy dtype for one sample of a VapourSynth video format"""
+    if fmt is None:
+        raise ValueError("Variable-format clips have no fixed sample type")
+    if fmt.sample_type == vs.INTEGER:
+        if fmt.bits_per_sample <= 8:
+            return np.dtype(np.uint8)
+        if fmt.bits_per_sample <= 16:
+            return np.dtype(np.uint16)
+    elif fmt.sample_type == vs.FLOAT:
+        if fmt.bits_per_sample == 16:
+            return np.dtype(np.float16)
+        if fmt.bits_per_sample == 32:
+            return np.dtype(np.float32)
+    raise ValueError(f"Unsupported format {fmt.name}")
+
+
+def plane_shapes(clip_or_frame):
+    """(height, width) of every plane, accounting for chroma subsampling"""
+    fmt = clip_or_frame.format
+    if fmt is None or not clip_or_frame.width:
+        raise ValueError("Variable-format or variable-size clips are not supported")
+    shapes = []
+    for plane in range(fmt.num_planes):
+        if plane == 0 or fmt.color_family == vs.RGB:
+            shapes.append((clip_or_frame.height, clip_or_frame.width))
+        else:
+            shapes.append((clip_or_frame.height >> fmt.subsampling_h,
+                           clip_or_frame.width >> fmt.subsampling_w))
+    return shapes
+
+
+def frame_to_array(frame, plane=0):
+    """Zero-copy (height, width) view of one plane
+
+    The view keeps the frame alive. It is read-only unless the frame is
+    writable (for example one returned by frame.copy()).
+    """
+    return np.asarray(frame[plane])
+
+
+def frame_planes(frame):
+    """Zero-copy views of every plane of a frame"""
+    return [np.asarray(frame[plane]) for plane in range(frame.format.num_planes)]
+
+
+def array_to_frame(planes, frame):
+    """Write one array per plane into a writable copy of frame and return it"""
+    out = frame.copy()
+    if len(planes) != out.format.num_planes:
+        raise ValueError(f"Expected {out.format.num_planes} planes, got {len(planes)}")
+    for plane, src in enumerate(planes):
+        np.copyto(np.asarray(out[plane]), src, casting="same_kind")
+    return out
+
+
+def apply_numpy(clip, func, inplace=False):
+    """Run a NumPy function over every frame of a clip
+
+    func receives the list of plane arrays. With inplace=True the planes
+    are writable views into the output frame and func edits them
+    directly; otherwise func returns new planes which are copied in.
+    """
+    def modify(n, f):
+        if inplace:
+            out = f.copy()
+            func(frame_planes(out))
+            return out
+        return array_to_frame(func(frame_planes(f)), f)
+
+    return core.std.ModifyFrame(clip, clip, modify)
+
+
+def allocate_batch(clip, count):
+    """Preallocate one (count, height, width) array per plane for a clip"""
+    dtype = plane_dtype(clip.format)
+    return [np.empty((count,) + shape, dtype=dtype) for shape in plane_shapes(clip)]
+
+
+def stack_frames(clip, frame_numbers, out=None):
+    """Copy frames into a preallocated per-plane batch
+
+    Each plane is copied once, straight from the frame buffer into its
+    slot in the batch. Pass out from allocate_batch to reuse memory
+    across calls.
+    """
+    frame_numbers = list(frame_numbers)
+    if out is None:
+        out = allocate_batch(clip, len(frame_numbers))
+    elif out[0].shape[0] < len(frame_numbers):
+        raise ValueError(f"Batch holds {out[0].shape[0]} frames, asked for {len(frame_numbers)}")
+
+    for slot, n in enumerate(frame_numbers):
+        frame = clip.get_frame(n)
+        for plane, dest in enumerate(out):
+            np.copyto(dest[slot], np.asarray(frame[plane]))
+    return out
+
+
+class FrameReader:
+    """Stream a clip as NumPy planes with several frames in flight
+
+    Up to prefetch frames are requested at once with get_frame_async so
+    VapourSynth can render them on all its threads, while frames are
+    still yielded strictly in order. New requests are only issued as
+    the consumer takes frames, so a slow consumer applies backpressure
+    instead of letting rendered frames pile up.
+
+    With copy=True (the default) each frame is copied once into a ring
+    of preallocated buffers and released immediately; the yielded
+    arrays are overwritten after `buffers` further frames. With
+    copy=False the yielded arrays are zero-copy views that keep their
+    frame alive.
+    """
+
+    def __init__(self, clip, prefetch=None, start=0, end=None, copy=True, buffers=2):
+        self.clip = clip
+        self.prefetch = max(1, prefetch or core.num_threads)
+        self.start = start
+        self.end = clip.num_frames if end is None else min(end, clip.num_frames)
+        self.copy = copy
+        self.ring = allocate_batch(clip, buffers) if copy else None
+
+    def __len__(self):
+        return max(0, self.end - self.start)
+
+    def __iter__(self):
+        pending = deque()
+        next_request = self.start
+        while next_request < self.end and len(pending) < self.prefetch:
+            pending.append(self.clip.get_frame_async(next_request))
+            next_request += 1
+
+        slot = 0
+        while pending:
+            frame = pending.popleft().result()
+            if next_request < self.end:
+                pending.append(self.clip.get_frame_async(next_request))
+                next_request += 1
+
+            if not self.copy:
+                yield frame_planes(frame)
+                continue
+
+            planes = []
+            for plane, buffer in enumerate(self.ring):
+                np.copyto(buffer[slot], np.asarray(frame[plane]))
+                planes.append(buffer[slot])
+            del frame
+            yield planes
+            slot = (slot + 1) % len(self.ring[0])
+
+
+Y4M_MAGIC = b"YUV4MPEG2"
+Y4M_FRAME = b"FRAME\n"
+Y4M_SUBSAMPLING = {(1, 1): "420", (1, 0): "422", (0, 0): "444"}
+
+
+def frame_layout(fmt, shapes):
+    """Byte offset and shape of every plane inside one packed frame record"""
+    dtype = plane_dtype(fmt)
+    layout, offset = [], 0
+    for shape in shapes:
+        layout.append((offset, shape))
+        offset += shape[0] * shape[1] * dtype.itemsize
+    return layout, offset
+
+
+def y4m_colorspace(fmt):
+    """Y4M C tag for a format, e.g. 420jpeg, 444p10, mono16"""
+    if fmt.sample_type != vs.INTEGER:
+        raise ValueError(f"Y4M cannot hold float format {fmt.name}, use container='raw'")
+    if fmt.color_family == vs.GRAY:
+        return "mono" if fmt.bits_per_sample == 8 else f"mono{fmt.bits_per_sample}"
+    subsampling = Y4M_SUBSAMPLING.get((fmt.subsampling_w, fmt.subsampling_h))
+    if fmt.color_family != vs.YUV or subsampling is None:
+        raise ValueError(f"Y4M cannot hold {fmt.name}, use container='raw'")
+    if fmt.bits_per_sample == 8:
+        return "420jpeg" if subsampling == "420" else subsampling
+    return f"{subsampling}p{fmt.bits_per_sample}"
+
+
+def parse_y4m_colorspace(tag):
+    """Inverse of y4m_colorspace: (color family, bits, subsampling_w, subsampling_h)"""
+    if tag.startswith("mono"):
+        return vs.GRAY, int(tag[4:] or 8), 0, 0
+    subsampling, bits = tag[:3], tag[4:]
+    ssw, ssh = {v: k for k, v in Y4M_SUBSAMPLING.items()}[subsampling]
+    return vs.YUV, int(bits) if bits.isdigit() else 8, ssw, ssh
+
+
+def write_raw(clip, path, container="y4m", prefetch=None):
+    """Write a clip to disk through numpy.memmap
+
+    container="y4m" writes a standard YUV4MPEG2 stream (integer YUV and
+    GRAY only). container="raw" writes packed planes for any format, with
+    every frame starting on a page boundary, plus a path.json sidecar
+    describing the layout. Frames are rendered with FrameReader, so the
+    clip never has to fit in RAM.
+    """
+    path = Path(path)
+    fmt = clip.format
+    shapes = plane_shapes(clip)
+    layout, frame_bytes = frame_layout(fmt, shapes)
+    dtype = plane_dtype(fmt)
+    fps_num, fps_den = (clip.fps_num, clip.fps_den) if clip.fps_num else (25, 1)
+
+    if container == "y4m":
+        header = (f"YUV4MPEG2 W{clip.width} H{clip.height} F{fps_num}:{fps_den} "
+                  f"Ip A1:1 C{y4m_colorspace(fmt)}\n").encode()
+        record_start = len(Y4M_FRAME)
+        stride = record_start + frame_bytes
+    elif container == "raw":
+        header = b""
+        record_start = 0
+        stride = -(-frame_bytes // mmap.PAGESIZE) * mmap.PAGESIZE
+    else:
+        raise ValueError(f"Unknown container {container!r}")
+
+    with open(path, "wb") as f:
+        f.write(header)
+        f.truncate(len(header) + stride * clip.num_frames)
+
+    records = np.memmap(path, dtype=np.uint8, mode="r+", offset=len(header),
+                        shape=(clip.num_frames, stride))
+    for n, planes in enumerate(FrameReader(clip, prefetch=prefetch, copy=False)):
+        record = records[n]
+        if container == "y4m":
+            record[:record_start] = np.frombuffer(Y4M_FRAME, dtype=np.uint8)
+        for (offset, shape), src in zip(layout, planes):
+            start = record_start + offset
+            end = start + shape[0] * shape[1] * dtype.itemsize
+            record[start:end].view(dtype).reshape(shape)[:] = src
+    records.flush()
+    del records
+
+    if container == "raw":
+        sidecar = {
+            "width": clip.width, "height": clip.height, "num_frames": clip.num_frames,
+            "fps_num": fps_num, "fps_den": fps_den,
+            "color_family": fmt.color_family.name, "sample_type": fmt.sample_type.name,
+            "bits_per_sample": fmt.bits_per_sample,
+            "subsampling_w": fmt.subsampling_w, "subsampling_h": fmt.subsampling_h,
+            "frame_stride": stride,
+        }
+        with open(path.with_name(path.name + ".json"), "w") as f:
+            json.dump(sidecar, f, indent=2)
+    return path
+
+
+class RawVideo:
+    """Lazily indexed, memory-mapped view of a file written by write_raw
+
+    video[n] returns read-only plane arrays backed directly by the page
+    cache; nothing is read until a frame is touched, and each access
+    asks the kernel to read the whole frame at once (MADV_WILLNEED where
+    available) so a random seek costs about one page fault.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = np.frombuffer(self.mm, dtype=np.uint8)
+
+        if self.mm[:len(Y4M_MAGIC)] == Y4M_MAGIC:
+            self.read_y4m_header()
+        else:
+            self.read_sidecar()
+
+        self.format = core.query_video_format(self.color_family, self.sample_type,
+                                              self.bits_per_sample, self.subsampling_w,
+                                              self.subsampling_h)
+        self.dtype = plane_dtype(self.format)
+        self.layout, self.frame_bytes = frame_layout(self.format, plane_shapes(self))
+        if self.stride is None:
+            self.stride = self.record_start + self.frame_bytes
+            self.num_frames = (len(self.mm) - self.header_bytes) // self.stride
+
+    def read_y4m_header(self):
+        end = self.mm.find(b"\n")
+        tags = {token[:1]: token[1:] for token in self.mm[:end].decode().split()[1:]}
+        self.width, self.height = int(tags["W"]), int(tags["H"])
+        self.fps_num, self.fps_den = (int(x) for x in tags.get("F", "25:1").split(":"))
+        (self.color_family, self.bits_per_sample,
+         self.subsampling_w, self.subsampling_h) = parse_y4m_colorspace(tags.get("C", "420jpeg"))
+        self.sample_type = vs.INTEGER
+        self.header_bytes = end + 1
+        self.record_start = len(Y4M_FRAME)
+        self.stride = None
+
+    def read_sidecar(self):
+        with open(self.path.with_name(self.path.name + ".json")) as f:
+            meta = json.load(f)
+        self.width, self.height = meta["width"], meta["height"]
+        self.fps_num, self.fps_den = meta["fps_num"], meta["fps_den"]
+        self.color_family = getattr(vs, meta["color_family"])
+        self.sample_type = getattr(vs, meta["sample_type"])
+        self.bits_per_sample = meta["bits_per_sample"]
+        self.subsampling_w, self.subsampling_h = meta["subsampling_w"], meta["subsampling_h"]
+        self.header_bytes = 0
+        self.record_start = 0
+        self.stride = meta["frame_stride"]
+        self.num_frames = meta["num_frames"]
+
+    def __len__(self):
+        return self.num_frames
+
+    def __getitem__(self, n):
+        if n < 0:
+            n += self.num_frames
+        if not 0 <= n < self.num_frames:
+            raise IndexError(f"Frame {n} out of range")
+
+        start = self.header_bytes + n * self.stride + self.record_start
+        if hasattr(mmap, "MADV_WILLNEED"):
+            aligned = start - start % mmap.PAGESIZE
+            self.mm.madvise(mmap.MADV_WILLNEED, aligned, start + self.frame_bytes - aligned)
+
+        planes = []
+        for offset, shape in self.layout:
+            begin = start + offset
+            end = begin + shape[0] * shape[1] * self.dtype.itemsize
+            planes.append(self.data[begin:end].view(self.dtype).reshape(shape))
+        return planes
+
+    def to_clip(self):
+        """Expose the file as a VapourSynth clip that reads frames on demand"""
+        blank = core.std.BlankClip(width=self.width, height=self.height, format=self.format.id,
+                                   length=self.num_frames, fpsnum=self.fps_num,
+                                   fpsden=self.fps_den, keep=True)
+        return core.std.ModifyFrame(blank, blank, lambda n, f: array_to_frame(self[n], f))
+
+
+
+DEFAULT_FRAME_CACHE_BYTES = 1024 ** 3
+SLOT_ALIGNMENT = 64
+
+
+class CachedFrame(list):
+    """Read-only plane views of a cached frame, pinning its slot until released
+
+    Use it as a context manager or call release() once done with the
+    planes; while any lease on a slot is held the cache will not reuse it.
+    A lease that is dropped without release() unpins when it is collected,
+    so keep the lease, not just its planes, for as long as you read them.
+    """
+
+    def __init__(self, planes, cache=None, slot=None):
+        super().__init__(planes)
+        self.slot = slot
+        self.finalizer = weakref.finalize(self, cache.unpin, slot) if cache is not None else None
+
+    def release(self):
+        if self.finalizer is not None:
+            self.finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class FrameCache:
+    """Byte-bounded LRU of rendered frames, keyed by (clip, frame number)
+
+    Frames are stored in one arena preallocated as max_bytes // slot_bytes
+    fixed-size slots; slot_bytes defaults to the frame size of the first
+    clip seen, so pass the largest frame size up front when caching clips
+    of different sizes. A miss renders the frame and copies it into a
+    free (or the least recently used) slot once; a hit returns the
+    read-only plane views made at that time, without copying.
+
+    Every lookup returns a CachedFrame that pins its slot: pinned slots
+    are never evicted or reused, so the views keep showing their frame
+    until the lease is released. When every slot is pinned, a miss
+    returns a private copy that is not cached. Clips are kept alive while
+    they have cached frames, so their ids cannot be reused under the cache.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_FRAME_CACHE_BYTES, slot_bytes=None):
+        self.max_bytes = max_bytes
+        self.arena = None
+        self.slot_bytes = None
+        self.free = []
+        self.entries = OrderedDict()
+        self.clips = {}
+        self.pins = {}
+        self.dropped = set()
+        # Reentrant: a collected lease unpins from whatever code triggered the collection
+        self.lock = threading.RLock()
+        self.hits = self.misses = self.evictions = 0
+        if slot_bytes:
+            self.allocate(slot_bytes)
+
+    def allocate(self, slot_bytes):
+        slot_bytes = -(-slot_bytes // SLOT_ALIGNMENT) * SLOT_ALIGNMENT
+        slots = self.max_bytes // slot_bytes
+        if slots < 1:
+            raise ValueError(f"max_bytes={self.max_bytes} cannot hold one {slot_bytes}-byte frame")
+        self.arena = np.empty((slots, slot_bytes), dtype=np.uint8)
+        self.slot_bytes = slot_bytes
+        self.free = list(range(slots - 1, -1, -1))
+
+    def layout(self, clip):
+        """Plane layout of a clip's frames inside a slot"""
+        entry = self.clips.get(id(clip))
+        if entry is None:
+            fmt = clip.format
+            layout, frame_bytes = frame_layout(fmt, plane_shapes(clip))
+            if self.arena is None:
+                self.allocate(frame_bytes)
+            if frame_bytes > self.slot_bytes:
+                raise ValueError(f"{frame_bytes}-byte frames do not fit {self.slot_bytes}-byte slots; "
+                                 f"create the cache with slot_bytes={frame_bytes}")
+            entry = {"clip": clip, "layout": layout, "dtype": plane_dtype(fmt), "frames": 0}
+        return entry
+
+    def take_slot(self):
+        """A free slot, evicting the least recently used unpinned frame if there is none
+
+        Returns None when every slot is pinned.
+        """
+        if self.free:
+            return self.free.pop()
+        for key, (slot, _) in self.entries.items():
+            if slot not in self.pins:
+                del self.entries[key]
+                self.evictions += 1
+                self.release_clip(key[0])
+                return slot
+        return None
+
+    def pin(self, slot, planes):
+        self.pins[slot] = self.pins.get(slot, 0) + 1
+        return CachedFrame(planes, self, slot)
+
+    def unpin(self, slot):
+        with self.lock:
+            self.pins[slot] -= 1
+            if self.pins[slot] == 0:
+                del self.pins[slot]
+                if slot in self.dropped:  # forgotten while leased
+                    self.dropped.discard(slot)
+                    self.free.append(slot)
+
+    def drop_slot(self, slot):
+        """Return a slot whose frame was dropped, once nobody holds it"""
+        if slot in self.pins:
+            self.dropped.add(slot)
+        else:
+            self.free.append(slot)
+
+    def release_clip(self, clip_id):
+        entry = self.clips.get(clip_id)
+        if entry is not None:
+            entry["frames"] -= 1
+            if entry["frames"] == 0:
+                del self.clips[clip_id]
+
+    def get(self, clip, n):
+        """CachedFrame of frame n, rendering it on a miss; release it when done"""
+        key = (id(clip), n)
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.pin(*cached)
+            self.misses += 1
+            entry = self.layout(clip)
+
+        frame = clip.get_frame(n)
+
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is not None:  # another thread rendered it meanwhile
+                self.entries.move_to_end(key)
+                return self.pin(*cached)
+            slot = self.take_slot()
+            if slot is None:
+                return CachedFrame(np.array(frame[plane], copy=True)
+                                   for plane in range(len(entry["layout"])))
+            record = self.arena[slot]
+            planes = []
+            for plane, (offset, shape) in enumerate(entry["layout"]):
+                end = offset + shape[0] * shape[1] * entry["dtype"].itemsize
+                view = record[offset:end].view(entry["dtype"]).reshape(shape)
+                np.copyto(view, np.asarray(frame[plane]))
+                view.flags.writeable = False
+                planes.append(view)
+            self.entries[key] = (slot, planes)
+            entry = self.clips.setdefault(id(clip), entry)
+            entry["frames"] += 1
+            return self.pin(slot, planes)
+
+    def __getitem__(self, key):
+        clip, n = key
+        return self.get(clip, n)
+
+    def __contains__(self, key):
+        clip, n = key
+        return (id(clip), n) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def forget(self, clip):
+        """Drop every cached frame of a clip"""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == id(clip)]:
+                slot, _ = self.entries.pop(key)
+                self.drop_slot(slot)
+                self.release_clip(key[0])
+
+    def clear(self):
+        """Drop every cached frame and reset the counters"""
+        with self.lock:
+            for (clip_id, _), (slot, _) in self.entries.items():
+                self.drop_slot(slot)
+            self.entries.clear()
+            self.clips.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Hit/miss counters and occupancy"""
+        lookups = self.hits + self.misses
+        slots = len(self.arena) if self.arena is not None else 0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "frames": len(self.entries),
+            "pinned": len(self.pins),
+            "slots": slots,
+            "slot_bytes": self.slot_bytes,
+            "bytes_used": len(self.entries) * (self.slot_bytes or 0),
+            "bytes_reserved": slots * (self.slot_bytes or 0),
+        }
+
+
+INTERP_BLOCK = 16
+INTERP_SEARCH = 8
+MOTION_SAMPLE_STEP = 2
+TILES_PER_WORKER = 2
+
+
+def search_offsets(search):
+    """Every (dy, dx) in the search window, shortest vectors first so ties keep still blocks"""
+    offsets = [(dy, dx) for dy in range(-search, search + 1) for dx in range(-search, search + 1)]
+    return sorted(offsets, key=lambda v: (abs(v[0]) + abs(v[1]), v))
+
+
+def edge_window(plane, ys, xs):
+    """plane[ys][:, xs] as float32, repeating edge pixels for coordinates outside the plane"""
+    height, width = plane.shape
+    rows = plane.take(np.clip(ys, 0, height - 1), axis=0)
+    return rows.take(np.clip(xs, 0, width - 1), axis=1).astype(np.float32)
+
+
+def block_motion(prev, nxt, block=INTERP_BLOCK, search=INTERP_SEARCH, rows=None):
+    """Symmetric block matching between two planes
+
+    For each block of the (not yet existing) middle frame, finds the
+    vector v that minimises the SAD between prev shifted by -v and nxt
+    shifted by +v, so every output block has exactly one source in each
+    frame and there are no holes to fill. Each candidate vector is
+    scored for all blocks at once; the SAD is taken on every
+    MOTION_SAMPLE_STEP-th pixel. rows=(start, stop) limits the search to
+    those block rows. Returns a (2, block rows, block columns) array of
+    half-motion vectors (dy, dx).
+    """
+    height, width = prev.shape
+    start, stop = rows or (0, -(-height // block))
+    columns = -(-width // block)
+    step = MOTION_SAMPLE_STEP if block % MOTION_SAMPLE_STEP == 0 else 1
+    ys = np.arange(start * block - search, stop * block + search)
+    xs = np.arange(-search, columns * block + search)
+
+    # Split each window into step x step contiguous phases, so a shifted,
+    # subsampled view is a plain slice of one phase
+    phases = []
+    for plane in (prev, nxt):
+        window = edge_window(plane, ys, xs)
+        phases.append({(p, q): np.ascontiguousarray(window[p::step, q::step])
+                       for p in range(step) for q in range(step)})
+
+    grid_rows, sample = stop - start, block // step
+    h, w = grid_rows * sample, columns * sample
+    diff = np.empty((h, w), dtype=np.float32)
+    best = np.full((grid_rows, columns), np.inf, dtype=np.float32)
+    vectors = np.zeros((2, grid_rows, columns), dtype=np.intp)
+    for dy, dx in search_offsets(search):
+        ya, xa, yb, xb = search - dy, search - dx, search + dy, search + dx
+        a = phases[0][ya % step, xa % step][ya // step:ya // step + h, xa // step:xa // step + w]
+        b = phases[1][yb % step, xb % step][yb // step:yb // step + h, xb // step:xb // step + w]
+        np.subtract(a, b, out=diff)
+        np.abs(diff, out=diff)
+        # Sum block rows first: it keeps the reduction over contiguous memory
+        sad = diff.reshape(grid_rows, sample, w).sum(axis=1).reshape(grid_rows, columns, sample).sum(axis=2)
+        better = sad < best
+        best[better] = sad[better]
+        vectors[0][better] = dy
+        vectors[1][better] = dx
+    return vectors
+
+
+def compensate(prev, nxt, vectors, block_h, block_w, ratio_h, ratio_w, start, out):
+    """Blend the motion-compensated sources of block rows start.. into out
+
+    vectors are in luma pixels; ratio_h/ratio_w scale them and the
+    block size down for subsampled chroma planes.
+    """
+    height, width = prev.shape
+    y0 = start * block_h
+    y1 = min(y0 + vectors.shape[1] * block_h, height)
+    ys = np.arange(y0, y1)[:, None]
+    xs = np.arange(width)[None, :]
+    by = ys // block_h - start
+    bx = np.minimum(xs // block_w, vectors.shape[2] - 1)
+    dy = np.rint(vectors[0] / ratio_h).astype(np.intp)[by, bx]
+    dx = np.rint(vectors[1] / ratio_w).astype(np.intp)[by, bx]
+
+    a = prev[np.clip(ys - dy, 0, height - 1), np.clip(xs - dx, 0, width - 1)]
+    b = nxt[np.clip(ys + dy, 0, height - 1), np.clip(xs + dx, 0, width - 1)]
+    if np.issubdtype(prev.dtype, np.integer):
+        out[y0:y1] = (a.astype(np.uint32) + b + 1) >> 1
+    else:
+        out[y0:y1] = (a.astype(np.float32) + b) * 0.5
+    return out
+
+
+def interpolate_planes(prev_planes, next_planes, block=INTERP_BLOCK, search=INTERP_SEARCH,
+                       rows=None, out=None):
+    """Middle frame between two frames given as plane lists
+
+    Motion is estimated on the first plane (luma, or R for RGB) and
+    applied to every plane. rows=(start, stop) only fills those block
+    rows of out, which is how tiles are split across processes.
+    """
+    luma_h, luma_w = prev_planes[0].shape
+    start, stop = rows or (0, -(-luma_h // block))
+    vectors = block_motion(prev_planes[0], next_planes[0], block, search, (start, stop))
+    if out is None:
+        out = [np.empty_like(plane) for plane in prev_planes]
+    for a, b, dest in zip(prev_planes, next_planes, out):
+        ratio_h, ratio_w = luma_h // a.shape[0], luma_w // a.shape[1]
+        if block % ratio_h or block % ratio_w:
+            raise ValueError(f"Block size {block} does not divide into the chroma planes")
+        compensate(a, b, vectors, block // ratio_h, block // ratio_w, ratio_h, ratio_w, start, dest)
+    return out
+
+
+def slot_views(buffer, shapes, dtype, slots=3):
+    """Plane arrays for prev, next and out frames packed into one shared buffer"""
+    views, offset = [], 0
+    for _ in range(slots):
+        planes = []
+        for shape in shapes:
+            planes.append(np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset))
+            offset += shape[0] * shape[1] * dtype.itemsize
+        views.append(planes)
+    return views
+
+
+TILE_WORKER = {}
+WORKER_START_TIMEOUT = 60
+
+
+def attach_tile_worker(name, shapes, dtype, block, search, started=None):
+    """Pool initializer: map the shared frame buffers once per worker process
+
+    With started (a barrier), waits until every worker of the pool is up.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    TILE_WORKER.update(shm=shm, slots=slot_views(shm.buf, shapes, np.dtype(dtype)),
+                       block=block, search=search)
+    if started is not None:
+        started.wait(WORKER_START_TIMEOUT)
+
+
+def interpolate_tile(rows):
+    """Fill one band of block rows of the shared output frame"""
+    prev, nxt, out = TILE_WORKER["slots"]
+    interpolate_planes(prev, nxt, TILE_WORKER["block"], TILE_WORKER["search"], rows, out)
+    return rows
+
+
+def environment_python():
+    """Interpreter of the running environment: the venv's own, else the base install's"""
+    prefix = Path(sys.prefix)
+    if os.name == "nt":
+        candidates = [prefix / "Scripts" / "python.exe", prefix / "python.exe"]
+    else:
+        candidates = [prefix / "bin" / "python3", prefix / "bin" / "python"]
+    return next((python for python in candidates if python.exists()), candidates[0])
+
+
+def pool_context():
+    """forkserver where the OS has it, otherwise spawn, with the environment's own python
+
+    Never fork: forking a process that is running VapourSynth threads can
+    deadlock the child. Players and vspipe embed Python, so sys.executable
+    may be the host program rather than an interpreter that can start workers.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    context = multiprocessing.get_context(method)
+    if not Path(sys.executable).name.lower().startswith("python"):
+        context.set_executable(str(environment_python()))
+    return context
+
+
+def release_pool(executor, shm):
+    executor.shutdown(wait=True)
+    try:
+        shm.close()
+    except BufferError:
+        pass  # a caller still holds views; the mapping goes when they do
+    shm.unlink()
+
+
+class InterpolationPool:
+    """Interpolate frame pairs tile by tile across worker processes
+
+    The two source frames and the result live in one shared-memory
+    block that each worker maps once when it starts, so per frame only
+    the copy in, a list of block-row bands and the copy out cross the
+    process boundary. Frames are interpolated one at a time, each using
+    every worker.
+    """
+
+    def __init__(self, shapes, dtype, block=INTERP_BLOCK, search=INTERP_SEARCH, workers=None):
+        self.shapes = [tuple(shape) for shape in shapes]
+        self.dtype = np.dtype(dtype)
+        self.workers = workers or os.cpu_count() or 1
+        frame_bytes = sum(h * w for h, w in self.shapes) * self.dtype.itemsize
+        self.shm = shared_memory.SharedMemory(create=True, size=3 * frame_bytes)
+        self.prev, self.next, self.out = slot_views(self.shm.buf, self.shapes, self.dtype)
+
+        grid_rows = -(-self.shapes[0][0] // block)
+        band = max(1, -(-grid_rows // (self.workers * TILES_PER_WORKER)))
+        self.tiles = [(start, min(start + band, grid_rows)) for start in range(0, grid_rows, band)]
+        context = pool_context()
+        started = context.Barrier(self.workers)
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=context,
+                                            initializer=attach_tile_worker,
+                                            initargs=(self.shm.name, self.shapes,
+                                                      self.dtype.str, block, search, started))
+        self.lock = threading.Lock()
+        self.finalizer = weakref.finalize(self, release_pool, self.executor, self.shm)
+
+        # Start every worker now, before any rendering, rather than lazily
+        # from a frame callback on a VapourSynth thread. Workers block in
+        # the initializer until all are up, so each call starts a new one.
+        for future in [self.executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def interpolate(self, prev_planes, next_planes, out=None):
+        """Middle frame of two plane lists, copied into out (new arrays if None)"""
+        with self.lock:
+            for dest, src in zip(self.prev + self.next, list(prev_planes) + list(next_planes)):
+                np.copyto(dest, src)
+            for _ in self.executor.map(interpolate_tile, self.tiles):
+                pass
+            if out is None:
+                return [plane.copy() for plane in self.out]
+            for dest, src in zip(out, self.out):
+                np.copyto(dest, src)
+            return out
+
+    def close(self):
+        self.prev = self.next = self.out = None
+        self.finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def double_clip(clip):
+    """Frame-doubling baseline: every frame shown twice at twice the frame rate"""
+    return core.std.Interleave([clip, clip])
+
+
+def interpolate_clip(clip, block=INTERP_BLOCK, search=INTERP_SEARCH, workers=None):
+    """Double a clip's frame rate on the CPU with motion-compensated middle frames
+
+    Even output frames are the source frames; odd ones are interpolated
+    between a frame and the next (the last frame is repeated). Across a
+    scene change marked in the frame props (see mark_scenes) the frame
+    is repeated instead of interpolated. The work
+    is split into tiles on an InterpolationPool of `workers` processes;
+    workers=0 interpolates in the calling thread instead.
+    """
+    shapes = plane_shapes(clip)
+    pool = None
+    if workers != 0:
+        pool = InterpolationPool(shapes, plane_dtype(clip.format), block, search, workers)
+
+    following = clip[1:] + clip[-1] if clip.num_frames > 1 else clip
+    doubled = double_clip(clip)
+    pairs = core.std.Interleave([clip, following])
+
+    def middle(n, f):
+        if n % 2 == 0 or f[0].props.get("_SceneChangeNext") or f[1].props.get("_SceneChangePrev"):
+            return f[0]
+        out = f[0].copy()
+        if pool is None:
+            interpolate_planes(frame_planes(f[0]), frame_planes(f[1]), block, search,
+                               out=frame_planes(out))
+        else:
+            pool.interpolate(frame_planes(f[0]), frame_planes(f[1]), frame_planes(out))
+        return out
+
+    return core.std.ModifyFrame(doubled, [doubled, pairs], middle)
+
+
+def measure_fps(clip, frames=None, prefetch=None):
+    """Render the first frames of a clip and return frames per second"""
+    reader = FrameReader(clip, prefetch=prefetch, end=frames, copy=False)
+    start = time.perf_counter()
+    count = sum(1 for _ in reader)
+    return count / max(time.perf_counter() - start, 1e-9)
+
+
+def panning_clip(width=1280, height=720, length=48, speed=(2, 4), format=vs.YUV420P8):
+    """Synthetic clip of a random texture panning by speed=(dy, dx) pixels per frame"""
+    blank = core.std.BlankClip(width=width, height=height, format=format, length=length, keep=True)
+    dtype = plane_dtype(blank.format)
+    peak = 1.0 if dtype.kind == "f" else (1 << blank.format.bits_per_sample) - 1
+    rng = np.random.default_rng(0)
+    textures = []
+    for h, w in plane_shapes(blank):
+        coarse = rng.random((-(-h // 4), -(-w // 4)))
+        texture = np.repeat(np.repeat(coarse, 4, axis=0), 4, axis=1)[:h, :w]
+        textures.append((texture * peak * 0.8 + peak * 0.1).astype(dtype))
+
+    def pan(n, f):
+        planes = []
+        for texture in textures:
+            ratio_h, ratio_w = height // texture.shape[0], width // texture.shape[1]
+            shift = (n * speed[0] // ratio_h, n * speed[1] // ratio_w)
+            planes.append(np.roll(texture, shift, axis=(0, 1)))
+        return array_to_frame(planes, f)
+
+    return core.std.ModifyFrame(blank, blank, pan)
+
+
+def benchmark_interpolation(clip, frames=None, block=INTERP_BLOCK, search=INTERP_SEARCH,
+                            workers=None):
+    """fps of CPU interpolation against plain frame doubling of the same clip"""
+    baseline = double_clip(clip)
+    frames = min(frames or baseline.num_frames, baseline.num_frames)
+    interpolated = interpolate_clip(clip, block, search, workers)
+    return {
+        "frames": frames,
+        "workers": 0 if workers == 0 else workers or os.cpu_count() or 1,
+        "baseline_fps": measure_fps(baseline, frames),
+        "interpolated_fps": measure_fps(interpolated, frames),
+    }
+
+
+SCENE_BATCH = 16
+SCENE_WINDOW = 24
+SCENE_DOWNSCALE = 8
+SCENE_BINS = 32
+SCENE_MIN_SAD = 0.05
+SCENE_RATIO = 3.0
+SCENE_MIN_HIST = 0.15
+SCENE_INDEX_VERSION = 1
+
+
+def plane_range(fmt, plane):
+    """(low, peak) sample values of one plane"""
+    if fmt.sample_type == vs.FLOAT:
+        chroma = fmt.color_family == vs.YUV and plane > 0
+        return (-0.5, 0.5) if chroma else (0.0, 1.0)
+    return 0, (1 << fmt.bits_per_sample) - 1
+
+
+def downscale_luma(batch, factor, low, peak):
+    """(n, h, w) batch -> block means over factor x factor pixels, scaled to 0..1"""
+    n, height, width = batch.shape
+    factor = max(1, min(factor, height, width))
+    h, w = height - height % factor, width - width % factor
+    blocks = batch[:, :h, :w].reshape(n, h // factor, factor, w // factor, factor)
+    small = blocks.sum(axis=2, dtype=np.float32).sum(axis=3) / (factor * factor)
+    return (small - low) / (peak - low)
+
+
+def plane_histograms(batch, bins, low, peak, sample=1):
+    """Normalised (n, bins) histograms of a batch, one bincount for every frame at once"""
+    n = batch.shape[0]
+    pixels = batch[:, ::sample, ::sample]
+    if np.issubdtype(batch.dtype, np.integer):
+        bits = int(peak).bit_length()
+        index = pixels >> max(0, bits - (bins.bit_length() - 1))
+    else:
+        index = np.clip((pixels - low) / (peak - low) * bins, 0, bins - 1).astype(np.intp)
+    index = index + (np.arange(n) * bins)[:, None, None]
+    counts = np.bincount(index.ravel(), minlength=n * bins).reshape(n, bins)
+    return counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+
+
+class SceneDetector:
+    """Streaming hard-cut detection
+
+    Frames are read with FrameReader into a preallocated batch and the
+    statistics of the whole batch are computed at once: the mean
+    absolute difference of factor-downscaled luma (SAD) and the change
+    in per-plane histograms between each frame and the one before.
+
+    Frame n is a cut when its SAD is at least min_sad and ratio times
+    the median SAD of the last `window` frames, and its histograms
+    changed by at least min_hist. The adaptive part keeps noisy or fast
+    scenes from cutting everywhere; the histogram test keeps pans and
+    fast motion, which move pixels without changing the histogram, from
+    counting as cuts.
+    """
+
+    def __init__(self, clip, window=SCENE_WINDOW, batch=SCENE_BATCH, downscale=SCENE_DOWNSCALE,
+                 bins=SCENE_BINS, min_sad=SCENE_MIN_SAD, ratio=SCENE_RATIO,
+                 min_hist=SCENE_MIN_HIST, prefetch=None):
+        if bins & (bins - 1):
+            raise ValueError(f"bins must be a power of two, got {bins}")
+        self.clip = clip
+        self.window = window
+        self.batch = batch
+        self.downscale = downscale
+        self.bins = bins
+        self.min_sad = min_sad
+        self.ratio = ratio
+        self.min_hist = min_hist
+        self.prefetch = prefetch
+        self.ranges = [plane_range(clip.format, plane) for plane in range(clip.format.num_planes)]
+
+    def settings(self):
+        return {"window": self.window, "downscale": self.downscale, "bins": self.bins,
+                "min_sad": self.min_sad, "ratio": self.ratio, "min_hist": self.min_hist}
+
+    def batch_stats(self, planes):
+        """Luma thumbnails and per-plane histograms of the frames in a batch"""
+        low, peak = self.ranges[0]
+        thumbs = downscale_luma(planes[0], self.downscale, low, peak)
+        sample = max(1, self.downscale // 2)
+        hists = np.stack([plane_histograms(batch, self.bins, low, peak, sample)
+                          for batch, (low, peak) in zip(planes, self.ranges)], axis=1)
+        return thumbs, hists
+
+    def scores(self):
+        """Yield (frame, sad, hist) for every frame; frame 0 compares with itself"""
+        buffers = allocate_batch(self.clip, self.batch)
+        previous = None
+        count = 0
+        n = 0
+
+        def flush(count):
+            nonlocal previous
+            thumbs, hists = self.batch_stats([buffer[:count] for buffer in buffers])
+            before_thumbs = np.concatenate([previous[0] if previous else thumbs[:1], thumbs[:-1]])
+            before_hists = np.concatenate([previous[1] if previous else hists[:1], hists[:-1]])
+            sads = np.abs(thumbs - before_thumbs).mean(axis=(1, 2))
+            hist_changes = 0.5 * np.abs(hists - before_hists).sum(axis=2).mean(axis=1)
+            previous = (thumbs[-1:], hists[-1:])
+            return zip(sads.tolist(), hist_changes.tolist())
+
+        for planes in FrameReader(self.clip, prefetch=self.prefetch, copy=False):
+            for buffer, src in zip(buffers, planes):
+                np.copyto(buffer[count], src)
+            count += 1
+            if count == self.batch:
+                for sad, hist in flush(count):
+                    yield n, sad, hist
+                    n += 1
+                count = 0
+        if count:
+            for sad, hist in flush(count):
+                yield n, sad, hist
+                n += 1
+
+    def __iter__(self):
+        """Yield {"frame", "sad", "hist", "cut"} for every frame, in order"""
+        history = deque(maxlen=self.window)
+        for n, sad, hist in self.scores():
+            baseline = float(np.median(history)) if history else 0.0
+            cut = (n > 0 and sad >= self.min_sad and sad >= self.ratio * baseline
+                   and hist >= self.min_hist)
+            if not cut:
+                history.append(sad)
+            yield {"frame": n, "sad": sad, "hist": hist, "cut": cut}
+
+
+def detect_scenes(clip, index_path=None, **options):
+    """Cut frames of a clip (each the first frame of a new scene)
+
+    With index_path the per-frame scores and cuts are also written there
+    as a JSON side-car index for mark_scenes and later runs.
+    """
+    detector = SceneDetector(clip, **options)
+    records = list(detector)
+    cuts = [r["frame"] for r in records if r["cut"]]
+    if index_path is not None:
+        index = {
+            "version": SCENE_INDEX_VERSION,
+            "num_frames": len(records),
+            "settings": detector.settings(),
+            "cuts": cuts,
+            "sad": [round(r["sad"], 5) for r in records],
+            "hist": [round(r["hist"], 5) for r in records],
+        }
+        with open(index_path, "w") as f:
+            json.dump(index, f)
+    return cuts
+
+
+def load_scene_index(path):
+    """Read a side-car index written by detect_scenes"""
+    with open(path) as f:
+        index = json.load(f)
+    if index.get("version") != SCENE_INDEX_VERSION:
+        raise ValueError(f"{path} is scene index version {index.get('version')}, "
+                         f"expected {SCENE_INDEX_VERSION}")
+    return index
+
+
+def mark_scenes(clip, cuts):
+    """Set _SceneChangePrev/_SceneChangeNext frame props around every cut
+
+    cuts is a list of cut frames or the path of a side-car index. These
+    are VapourSynth's standard scene-change props, so interpolate_clip
+    and other scene-aware filters skip those frames.
+    """
+    if isinstance(cuts, (str, Path)):
+        cuts = load_scene_index(cuts)["cuts"]
+    cuts = set(cuts)
+    before = {cut - 1 for cut in cuts}
+
+    def mark(n, f):
+        if n not in cuts and n not in before:
+            return f
+        out = f.copy()
+        out.props["_SceneChangePrev"] = int(n in cuts)
+        out.props["_SceneChangeNext"] = int(n in before)
+        return out
+
+    return core.std.ModifyFrame(clip, clip, mark)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CPU interpolation benchmark and scene-change index")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    bench = commands.add_parser("benchmark", help="Benchmark CPU 2x frame interpolation")
+    bench.add_argument("--width", type=int, default=1280)
+    bench.add_argument("--height", type=int, default=720)
+    bench.add_argument("--frames", type=int, default=48, help="Source frames (output is twice as many)")
+    bench.add_argument("--block", type=int, default=INTERP_BLOCK, help="Motion block size")
+    bench.add_argument("--search", type=int, default=INTERP_SEARCH, help="Search radius in pixels")
+    bench.add_argument("--workers", type=int, default=None,
+                       help="Worker processes (default: all cores, 0 = in-process)")
+    bench.add_argument("--json", action="store_true", help="Print the result as JSON")
+
+    scenes = commands.add_parser("scenes", help="Write a scene-change index for a .y4m or write_raw file")
+    scenes.add_argument("video", type=Path)
+    scenes.add_argument("--index", type=Path, help="Index path (default: VIDEO.scenes.json)")
+    scenes.add_argument("--min-sad", type=float, default=SCENE_MIN_SAD,
+                        help="Minimum downscaled-luma difference for a cut (0-1)")
+    scenes.add_argument("--ratio", type=float, default=SCENE_RATIO,
+                        help="How far above the recent median difference a cut must be")
+    scenes.add_argument("--min-hist", type=float, default=SCENE_MIN_HIST,
+                        help="Minimum histogram change for a cut (0-1)")
+    args = parser.parse_args()
+
+    if args.command == "scenes":
+        index_path = args.index or args.video.with_name(args.video.name + ".scenes.json")
+        video = RawVideo(args.video)
+        start = time.perf_counter()
+        cuts = detect_scenes(video.to_clip(), index_path, min_sad=args.min_sad,
+                             ratio=args.ratio, min_hist=args.min_hist)
+        seconds = time.perf_counter() - start
+        print(f"🎬 {len(cuts)} scene changes in {len(video)} frames "
+              f"({len(video) / max(seconds, 1e-9):.0f} fps)")
+        print(f"✅ Index: {index_path}")
+    else:
+        source = panning_clip(args.width, args.height, args.frames)
+        result = benchmark_interpolation(source, block=args.block, search=args.search,
+                                         workers=args.workers)
+        if args.json:
+            print(json.dumps(result, indent=2))
+        else:
+            print(f"🎞️  {args.width}x{args.height}, {args.frames} -> {result['frames']} frames, "
+                  f"{result['workers']} worker(s)")
+            print(f"  frame doubling : {result['baseline_fps']:8.1f} fps")
+            print(f"  interpolation  : {result['interpolated_fps']:8.1f} fps")
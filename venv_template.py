@@ -0,0 +1,160 @@
+"""
+Golden template environments
+Clones a verified VapourSynth environment into a new location using
+reflinks or hardlinks, so a per-user or per-job environment costs well
+under a second and almost no extra disk. Only the small files that
+embed the environment's own path (activate scripts, console-script
+shebangs, pyvenv.cfg, .pth files) are rewritten.
+
+Hardlinked clones share file contents with the template: pip replaces
+files rather than editing them, so installs into a clone are safe, but
+never edit a package file in place. Reflinks (copy-on-write, on btrfs,
+XFS, APFS-style filesystems) have no such caveat and are preferred.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+from pathlib import Path
+
+TEMPLATE_MARKER = ".vs_template.json"
+FICLONE = 0x40049409  # Linux ioctl for a copy-on-write clone
+REWRITE_MAX_BYTES = 4 * 1024 * 1024
+SCRIPT_DIRS = {"bin", "Scripts"}
+
+
+def reflink(src, dst):
+    """Copy-on-write clone of one file (Linux FICLONE)"""
+    import fcntl
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def copy_file(src, dst):
+    shutil.copy2(src, dst)
+
+
+LINKERS = {
+    "reflink": reflink,
+    "hardlink": os.link,
+    "copy": copy_file,
+}
+
+
+def link_modes(requested):
+    """Link strategies to try, best first"""
+    if requested != "auto":
+        return [requested]
+    modes = ["hardlink", "copy"]
+    if platform.system() == "Linux":
+        modes.insert(0, "reflink")
+    return modes
+
+
+def needs_rewrite(relative):
+    """Files that may embed the absolute path of the environment"""
+    parts = relative.parts
+    if len(parts) == 1:
+        return True  # pyvenv.cfg and friends
+    if parts[0] in SCRIPT_DIRS:
+        return True
+    return relative.suffix == ".pth"
+
+
+def clone_environment(template, dest, link="auto"):
+    """Clone a template environment into dest and return clone statistics"""
+    template = Path(template).resolve()
+    dest = Path(dest).resolve()
+    if not (template / "pyvenv.cfg").exists():
+        raise ValueError(f"{template} is not a virtual environment")
+    if dest.exists():
+        raise FileExistsError(f"{dest} already exists")
+
+    old_path, new_path = str(template).encode(), str(dest).encode()
+    modes = link_modes(link)
+    stats = {"files": 0, "rewritten": 0, "mode": None, "seconds": 0.0}
+    start = time.perf_counter()
+
+    for root, dirs, files in os.walk(template):
+        root = Path(root)
+        relative_root = root.relative_to(template)
+        target_root = dest / relative_root
+        target_root.mkdir(parents=True, exist_ok=True)
+
+        for name in list(dirs):
+            if (root / name).is_symlink():
+                dirs.remove(name)
+                files.append(name)
+
+        for name in files:
+            src = root / name
+            dst = target_root / name
+            relative = relative_root / name
+            if relative == Path(TEMPLATE_MARKER):
+                continue
+            stats["files"] += 1
+
+            if src.is_symlink():
+                link_target = os.readlink(src)
+                if link_target.startswith(str(template)):
+                    link_target = str(dest) + link_target[len(str(template)):]
+                os.symlink(link_target, dst)
+                continue
+
+            # Small per-environment files always get a private copy, so
+            # later writes to them (test_setup.py, launchers) never reach
+            # the template through a shared inode
+            if needs_rewrite(relative) and src.stat().st_size <= REWRITE_MAX_BYTES:
+                data = src.read_bytes()
+                if old_path in data:
+                    data = data.replace(old_path, new_path)
+                    stats["rewritten"] += 1
+                dst.write_bytes(data)
+                shutil.copystat(src, dst)
+                continue
+
+            while True:
+                try:
+                    LINKERS[modes[0]](src, dst)
+                    break
+                except OSError:
+                    if len(modes) == 1:
+                        raise
+                    modes.pop(0)
+            stats["mode"] = modes[0]
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def mark_template(env_dir, requirements, installed, verified):
+    """Record that an environment is a (verified) template"""
+    marker = {
+        "requirements": sorted(requirements),
+        "installed": installed,
+        "verified": verified,
+        "python": f"{sys.version_info.major}.{sys.version_info.minor}",
+        "platform": platform.system(),
+        "created": time.time(),
+    }
+    with open(Path(env_dir) / TEMPLATE_MARKER, "w") as f:
+        json.dump(marker, f, indent=2)
+    return marker
+
+
+def read_template(env_dir):
+    """Template marker of an environment, or None if it is not a template"""
+    try:
+        with open(Path(env_dir) / TEMPLATE_MARKER) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None